@@ -0,0 +1,7 @@
+"""
+Reusable helpers that back the tutorial notebooks.
+
+Each submodule is imported explicitly (for example
+``from causal_tutorial.slearner import SLearner``) so that a notebook only pays
+the import cost of the pieces it actually uses.
+"""
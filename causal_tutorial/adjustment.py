@@ -0,0 +1,206 @@
+"""
+Backdoor adjustment sets read straight off a DAG.
+
+Notebook 1 asks which covariates to control for in ``complex_example`` and
+notebook 2 picks the churn confounders by eye. The functions here check the
+backdoor criterion with the bitset d-separation of ``causal_tutorial.dseparation``:
+a set Z is valid for the effect of T on Y when it contains no descendant of T
+and d-separates T from Y once T's outgoing edges are removed. Finding a minimal
+set takes one such check per parent of T, so solving every (treatment, outcome)
+pair of a graph with a few hundred nodes needs no DoWhy identification step.
+"""
+
+from itertools import combinations
+
+from causal_tutorial.dseparation import BitDAG, iter_bits
+
+
+def _masks(dag, treatment, outcome):
+    t, y = dag.mask(treatment), dag.mask(outcome)
+    if not t or not y:
+        raise ValueError("treatment and outcome must each name at least one node")
+    if t & y:
+        raise ValueError("treatment and outcome must not overlap")
+    return t, y
+
+
+def _is_backdoor(dag, t, y, z):
+    if z & (t | y) or z & dag.descendants(t):
+        return False
+    relevant = t | y | z
+    relevant |= dag.ancestors(relevant)
+    return not dag.reachable(t, z, cut=t, within=relevant) & y
+
+
+def is_backdoor_set(graph, treatment, outcome, adjustment=()):
+    """
+    Whether `adjustment` satisfies the backdoor criterion for treatment -> outcome
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, edge list or BitDAG
+        treatment: Node name or iterable of node names
+        outcome: Node name or iterable of node names
+        adjustment: Iterable of node names, possibly empty
+
+    Returns: Bool
+    """
+    dag = BitDAG.from_graph(graph)
+    t, y = _masks(dag, treatment, outcome)
+    return _is_backdoor(dag, t, y, dag.mask(adjustment))
+
+
+def _minimal(dag, t, y):
+    parents = 0
+    for i in iter_bits(t):
+        parents |= dag.parents[i]
+    z = parents & ~t
+    if not _is_backdoor(dag, t, y, z):
+        return None
+    # Drop nodes one at a time, earliest in topological order first
+    for i in sorted(iter_bits(z), key=dag.order.index):
+        if _is_backdoor(dag, t, y, z & ~(1 << i)):
+            z &= ~(1 << i)
+    return z
+
+
+def minimal_backdoor_set(graph, treatment, outcome):
+    """
+    A minimal valid backdoor adjustment set for treatment -> outcome
+
+    The search starts from the parents of the treatment, which always block
+    every backdoor path, and drops any node the rest of the set doesn't need.
+    No proper subset of the result is a valid adjustment set.
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, edge list or BitDAG
+        treatment: Node name or iterable of node names
+        outcome: Node name or iterable of node names
+
+    Returns: Tuple of node names (empty when no adjustment is needed), or None
+        when no backdoor set exists, e.g. when the outcome is a parent of the
+        treatment
+    """
+    dag = BitDAG.from_graph(graph)
+    z = _minimal(dag, *_masks(dag, treatment, outcome))
+    return None if z is None else dag.names(z)
+
+
+def backdoor_sets(graph, treatment, outcome, minimal=True, max_size=None):
+    """
+    Every valid backdoor adjustment set for treatment -> outcome
+
+    The number of candidate sets grows exponentially with the number of nodes,
+    so this is meant for teaching-sized graphs; use `max_size` or
+    `minimal_backdoor_set` for large ones.
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, edge list or BitDAG
+        treatment: Node name or iterable of node names
+        outcome: Node name or iterable of node names
+        minimal: Bool, only return sets that have no valid proper subset
+        max_size: Optional int, largest set size to try
+
+    Returns: List of tuples of node names, smallest sets first
+    """
+    dag = BitDAG.from_graph(graph)
+    t, y = _masks(dag, treatment, outcome)
+    pool = ~dag.descendants(t) & ~(t | y) & ((1 << len(dag.nodes)) - 1)
+    if minimal:
+        # Minimal separators only ever use ancestors of the treatment or outcome
+        pool &= dag.ancestors(t | y)
+    candidates = list(iter_bits(pool))
+    max_size = len(candidates) if max_size is None else max_size
+
+    found = []
+    for size in range(min(max_size, len(candidates)) + 1):
+        for combo in combinations(candidates, size):
+            z = 0
+            for i in combo:
+                z |= 1 << i
+            if minimal and any(z & prev == prev for prev in found):
+                continue
+            if _is_backdoor(dag, t, y, z):
+                found.append(z)
+    return [dag.names(z) for z in found]
+
+
+def _minimal_for_outcomes(dag, t, outcomes):
+    """
+    `_minimal(dag, t, y)` for every y in the bitmask `outcomes` at once
+
+    Each candidate set is checked with one unrestricted Bayes-ball sweep from the
+    treatment, which answers the question for all outcomes together. Outcomes
+    that need the same set share its sweeps.
+
+    Returns: Dict mapping outcome bit to the adjustment set bitmask, or None
+    """
+    parents = 0
+    for i in iter_bits(t):
+        parents |= dag.parents[i]
+    z = parents & ~t
+    result = {y: None for y in iter_bits(outcomes)}
+    valid = outcomes & ~z & ~dag.reachable(t, z, cut=t)
+    if dag.descendants(t) & z:
+        valid = 0
+    groups = {z: valid} if valid else {}
+    for i in sorted(iter_bits(z), key=dag.order.index):
+        bit = 1 << i
+        next_groups = {}
+        for current, ys in groups.items():
+            if current & bit:
+                smaller = current & ~bit
+                dropped = ys & ~smaller & ~dag.reachable(t, smaller, cut=t)
+                if dropped:
+                    next_groups[smaller] = next_groups.get(smaller, 0) | dropped
+                ys &= ~dropped
+            if ys:
+                next_groups[current] = next_groups.get(current, 0) | ys
+        groups = next_groups
+    for current, ys in groups.items():
+        for y in iter_bits(ys):
+            result[y] = current
+    return result
+
+
+def adjustment_sets(graph, pairs=None):
+    """
+    Minimal backdoor sets for many (treatment, outcome) pairs on the same graph
+
+    Pairs are grouped by treatment, and every d-separation sweep is shared by all
+    outcomes of that treatment, so the cost grows with the number of treatments
+    rather than the number of pairs. The sets are the same ones
+    `minimal_backdoor_set` returns.
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, edge list or BitDAG
+        pairs: Optional iterable of (treatment, outcome) tuples. Defaults to every
+            pair of nodes where the outcome is a descendant of the treatment.
+
+    Returns: Dict mapping (treatment, outcome) to the result of
+        `minimal_backdoor_set`
+    """
+    dag = BitDAG.from_graph(graph)
+    if pairs is None:
+        pairs = [
+            (dag.nodes[i], dag.nodes[j])
+            for i in dag.order
+            for j in iter_bits(dag.descendants_of[i])
+        ]
+    pairs = list(pairs)
+
+    by_treatment = {}
+    for treatment, outcome in pairs:
+        t, y = _masks(dag, treatment, outcome)
+        if y & (y - 1):
+            raise ValueError("adjustment_sets takes a single outcome per pair")
+        by_treatment[t] = by_treatment.get(t, 0) | y
+
+    solved = {
+        t: _minimal_for_outcomes(dag, t, outcomes)
+        for t, outcomes in by_treatment.items()
+    }
+    out = {}
+    for treatment, outcome in pairs:
+        z = solved[dag.mask(treatment)][dag.index[outcome]]
+        out[treatment, outcome] = None if z is None else dag.names(z)
+    return out
@@ -0,0 +1,185 @@
+"""
+Bootstrap confidence intervals for g-computation / S-learner estimates.
+
+Every replicate resamples the rows of the design matrix, refits a clone of the
+outcome model and recomputes ATE, ATT and ATC on the resample. Replicates run on
+a ``concurrent.futures`` process pool. The design matrix is placed in shared
+memory once, so workers read it in place instead of receiving a pickled copy per
+task, and each replicate draws its rows from its own child of a
+``numpy.random.SeedSequence`` so results do not depend on the number of workers.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.base import clone
+
+from causal_tutorial.slearner import predict_counterfactuals, summarize_effects
+
+EFFECT_NAMES = ("ate", "att", "atc")
+
+# Populated in each worker process by `_init_worker`
+_WORKER_STATE = {}
+
+
+@dataclass(frozen=True)
+class BootstrapResult:
+    """
+    Bootstrap replicates of the S-learner treatment effects
+
+    Attributes:
+        point: TreatmentEffects of the model fitted on the full data
+        replicates: Array of shape (n_replicates, 3) holding the ATE, ATT and ATC
+            of each replicate, in that column order
+        confidence_level: Float, coverage of the percentile intervals
+    """
+
+    point: object
+    replicates: np.ndarray
+    confidence_level: float
+
+    def ci(self, effect="ate"):
+        """
+        Percentile confidence interval for one of the effects
+
+        Args:
+            effect: Str, one of "ate", "att" or "atc"
+
+        Returns: Tuple of floats (lower, upper)
+        """
+        values = self.replicates[:, EFFECT_NAMES.index(effect)]
+        alpha = (1 - self.confidence_level) / 2
+        lower, upper = np.nanpercentile(values, [100 * alpha, 100 * (1 - alpha)])
+        return float(lower), float(upper)
+
+    def summary(self):
+        """
+        Point estimate and interval for every effect
+
+        Returns: Dict mapping effect name to a (estimate, lower, upper) tuple
+        """
+        return {
+            name: (getattr(self.point, name), *self.ci(name)) for name in EFFECT_NAMES
+        }
+
+
+def _to_shared(array):
+    """
+    Copies `array` into a new shared memory block and returns the block
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _init_worker(model, x_spec, y_spec, treatment_idx):
+    x_block, X = _attach(x_spec)
+    y_block, y = _attach(y_spec)
+    # Keep the blocks referenced so the views stay valid for the worker's lifetime
+    _WORKER_STATE.update(
+        model=model,
+        X=X,
+        y=y,
+        treatment_idx=treatment_idx,
+        blocks=(x_block, y_block),
+    )
+
+
+def _run_replicate(seed_seq):
+    X = _WORKER_STATE["X"]
+    y = _WORKER_STATE["y"]
+    treatment_idx = _WORKER_STATE["treatment_idx"]
+
+    rng = np.random.default_rng(seed_seq)
+    rows = rng.integers(0, X.shape[0], size=X.shape[0])
+    X_boot = X[rows]
+    y_boot = y[rows]
+
+    model = clone(_WORKER_STATE["model"]).fit(X_boot, y_boot)
+    mu1, mu0 = predict_counterfactuals(model, X_boot, treatment_idx)
+    effects = summarize_effects(mu1, mu0, X_boot[:, treatment_idx])
+    return tuple(getattr(effects, name) for name in EFFECT_NAMES)
+
+
+def bootstrap_effects(
+    model,
+    X,
+    y,
+    treatment_idx,
+    n_replicates=1000,
+    confidence_level=0.95,
+    seed=0,
+    max_workers=None,
+):
+    """
+    Bootstrap ATE, ATT and ATC by refitting the outcome model on resamples
+
+    Args:
+        model: Unfitted scikit-learn style classifier, cloned for every fit
+        X: 2-D array of shape (n_rows, n_features)
+        y: 1-D array of outcomes
+        treatment_idx: Int, column index of the binary treatment in `X`
+        n_replicates: Int, number of bootstrap resamples
+        confidence_level: Float, coverage of the percentile intervals
+        seed: Int or numpy.random.SeedSequence that all replicate seeds are
+            spawned from. The same seed gives the same replicates for any
+            `max_workers`.
+        max_workers: Optional int, size of the process pool (defaults to the
+            number of CPUs). Use 1 to run every replicate in this process.
+
+    Returns: BootstrapResult
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    replicate_seeds = seed.spawn(n_replicates)
+
+    full_model = clone(model).fit(X, y)
+    mu1, mu0 = predict_counterfactuals(full_model, X, treatment_idx)
+    point = summarize_effects(mu1, mu0, X[:, treatment_idx])
+
+    if max_workers == 1:
+        _WORKER_STATE.update(model=model, X=X, y=y, treatment_idx=treatment_idx)
+        try:
+            rows = [_run_replicate(s) for s in replicate_seeds]
+        finally:
+            _WORKER_STATE.clear()
+    else:
+        n_workers = max_workers or os.cpu_count() or 1
+        x_block = _to_shared(X)
+        y_block = _to_shared(y)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_worker,
+                initargs=(
+                    model,
+                    (x_block.name, X.shape, X.dtype),
+                    (y_block.name, y.shape, y.dtype),
+                    treatment_idx,
+                ),
+            ) as pool:
+                chunksize = max(1, n_replicates // (4 * n_workers))
+                rows = list(
+                    pool.map(_run_replicate, replicate_seeds, chunksize=chunksize)
+                )
+        finally:
+            for block in (x_block, y_block):
+                block.close()
+                block.unlink()
+
+    return BootstrapResult(
+        point=point,
+        replicates=np.asarray(rows, dtype=np.float64).reshape(-1, len(EFFECT_NAMES)),
+        confidence_level=confidence_level,
+    )
@@ -0,0 +1,186 @@
+"""
+Dependency-light causal DAG, modelled on ``causalgraphicalmodels.CausalGraphicalModel``.
+
+Only the parts the notebooks use are kept: building a DAG from nodes and edges,
+walking it (parents, children, ancestors, descendants, topological order),
+intervening on a node, and drawing it. Nothing outside the standard library is
+imported until ``draw`` is called, which is when ``graphviz`` is loaded and the
+layout starts on a background thread (see ``causal_tutorial.rendering``).
+
+``topological_layers`` and ``topological_order`` work on a plain parents
+mapping, and are the one topological sort shared by the SCM samplers, the
+bitset d-separation and the fallback layout.
+"""
+
+
+def topological_layers(parents):
+    """
+    Layer of every node: 0 for roots, else one more than its deepest parent
+
+    Args:
+        parents: Dict mapping every node to an iterable of its parents
+
+    Returns: Dict mapping node to int, ordered by layer. Nodes on the same
+        layer keep the order they have in `parents`.
+    """
+    children = {node: [] for node in parents}
+    missing = {}
+    for node, node_parents in parents.items():
+        node_parents = list(node_parents)
+        missing[node] = len(node_parents)
+        for parent in node_parents:
+            if parent not in children:
+                raise ValueError(f"'{parent}' is a parent of '{node}' but not a node")
+            children[parent].append(node)
+
+    layer = {}
+    ready = [node for node in parents if not missing[node]]
+    for node in ready:
+        layer.setdefault(node, 0)
+    # `ready` grows while it is walked, so every node is visited once (Kahn)
+    for node in ready:
+        for child in children[node]:
+            layer[child] = max(layer.get(child, 0), layer[node] + 1)
+            missing[child] -= 1
+            if not missing[child]:
+                ready.append(child)
+    if len(ready) < len(parents):
+        remaining = [node for node in parents if missing[node]]
+        raise ValueError(f"The graph has a cycle among {remaining}")
+    return {node: layer[node] for node in sorted(parents, key=layer.__getitem__)}
+
+
+def topological_order(parents):
+    """
+    Orders nodes so that every parent comes before its children
+
+    Nodes on the same layer (see `topological_layers`) keep the order they have
+    in `parents`.
+
+    Args:
+        parents: Dict mapping every node to an iterable of its parents
+
+    Returns: List of nodes
+    """
+    return list(topological_layers(parents))
+
+
+class CausalGraphicalModel:
+    """
+    A directed acyclic graph over named variables
+
+    Args:
+        nodes: Iterable of str, the variables in the graph
+        edges: Iterable of (parent, child) tuples
+        set_nodes: Optional iterable of str, intervened-on variables. These are
+            drawn with a double outline and can't have parents.
+    """
+
+    def __init__(self, nodes, edges, set_nodes=None):
+        self.nodes = tuple(dict.fromkeys(nodes))
+        self.edges = tuple(dict.fromkeys((a, b) for a, b in edges))
+        self.set_nodes = frozenset(set_nodes or ())
+        self.observed_variables = frozenset(self.nodes)
+
+        self.parents = {node: [] for node in self.nodes}
+        self.children = {node: [] for node in self.nodes}
+        for a, b in self.edges:
+            if a not in self.parents or b not in self.parents:
+                raise ValueError(f"Edge ({a}, {b}) refers to a node not in the graph")
+            self.parents[b].append(a)
+            self.children[a].append(b)
+
+        for node in self.set_nodes:
+            if self.parents.get(node):
+                raise ValueError(f"Intervened-on node '{node}' can't have parents")
+
+        # Raises if the graph has a cycle
+        self._order = topological_order(self.parents)
+
+    def __repr__(self):
+        variables = ", ".join(map(str, sorted(self.observed_variables)))
+        return f"{self.__class__.__name__}({variables})"
+
+    def topological_order(self):
+        """
+        Nodes ordered so that every parent comes before its children
+
+        Returns: List of str
+        """
+        return list(self._order)
+
+    def _reach(self, node, neighbours):
+        seen = set()
+        stack = list(neighbours[node])
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(neighbours[current])
+        return seen
+
+    def ancestors(self, node):
+        """
+        All nodes with a directed path into `node`
+
+        Returns: Set of str
+        """
+        return self._reach(node, self.parents)
+
+    def descendants(self, node):
+        """
+        All nodes reachable from `node` along directed edges
+
+        Returns: Set of str
+        """
+        return self._reach(node, self.children)
+
+    def get_distribution(self):
+        """
+        Returns a string representing the factorized distribution implied by the graph
+        """
+        products = []
+        for node in self._order:
+            if node in self.set_nodes:
+                continue
+            parents = [
+                f"do({p})" if p in self.set_nodes else str(p)
+                for p in self.parents[node]
+            ]
+            if parents:
+                products.append(f"P({node}|{','.join(parents)})")
+            else:
+                products.append(f"P({node})")
+        return "".join(products)
+
+    def do(self, node):
+        """
+        Returns the graph after an intervention on `node`
+        """
+        if node not in self.observed_variables:
+            raise ValueError(f"'{node}' is not in the graph")
+        return CausalGraphicalModel(
+            nodes=self.nodes,
+            edges=[(a, b) for a, b in self.edges if b != node],
+            set_nodes=self.set_nodes | {node},
+        )
+
+    def draw(self):
+        """
+        graphviz.Digraph representation of the graph
+
+        The returned graph is a `causal_tutorial.rendering.Digraph`, which is
+        already being laid out in the background and is displayed from the SVG
+        cache.
+        """
+        from causal_tutorial.rendering import Digraph
+
+        dot = Digraph()
+        for node in self.nodes:
+            if node in self.set_nodes:
+                dot.node(node, node, {"shape": "ellipse", "peripheries": "2"})
+            else:
+                dot.node(node, node, {"shape": "ellipse"})
+        for a, b in self.edges:
+            dot.edge(a, b)
+        return dot.prefetch()
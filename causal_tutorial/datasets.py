@@ -0,0 +1,163 @@
+"""
+Local-first loader for the tutorial's churn dataset.
+
+The notebooks used to download ``causal_churn.csv`` from GitHub on every run even
+though the same file ships in ``data/``. ``load_churn`` reads the local copy,
+falling back to the download only when it is missing, and caches a parsed,
+dtype-optimized copy keyed by the CSV's content hash, so later kernel restarts
+skip CSV parsing altogether. The cache is written as Parquet when ``pyarrow`` is
+installed and as a pickle otherwise.
+"""
+
+import hashlib
+import os
+import shutil
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CHURN_CSV = DATA_DIR / "causal_churn.csv"
+CHURN_URL = (
+    "https://raw.githubusercontent.com/ronikobrosly/misc_dataset/main/causal_churn.csv"
+)
+CHURN_CATEGORICALS = ["region", "internation_plan", "voicemail_plan"]
+
+# Bump when `optimize_dtypes` changes so stale caches are not reused
+_CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """
+    Directory used for parsed dataset caches
+
+    Honours the CAUSAL_TUTORIAL_CACHE environment variable, otherwise uses
+    ~/.cache/causal_tutorial.
+
+    Returns: Path
+    """
+    env_dir = os.environ.get("CAUSAL_TUTORIAL_CACHE")
+    if env_dir:
+        return Path(env_dir)
+    return Path.home() / ".cache" / "causal_tutorial"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    SHA-256 hex digest of a file, read in chunks
+
+    Args:
+        path: Path or str of the file to hash
+        chunk_size: Int, number of bytes to read at a time
+
+    Returns: Str
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimize_dtypes(df, categoricals=()):
+    """
+    Shrinks a DataFrame's memory footprint without changing any values
+
+    The `categoricals` columns become `category` dtype, integer columns are
+    downcast to the smallest integer type that holds them, and float columns are
+    downcast to float32 only when that round-trips exactly.
+
+    Args:
+        df: DataFrame to convert (it is not modified)
+        categoricals: Iterable of str, columns to convert to `category`
+
+    Returns: DataFrame
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col in categoricals:
+            out[col] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series):
+            out[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            as_float32 = series.astype(np.float32)
+            if np.array_equal(
+                as_float32.to_numpy(np.float64), series.to_numpy(), equal_nan=True
+            ):
+                out[col] = as_float32
+            else:
+                out[col] = series
+        else:
+            out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def _have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _resolve_csv(path, cache_dir, url):
+    if path is not None:
+        return Path(path)
+    if CHURN_CSV.exists():
+        return CHURN_CSV
+    # Only reach for the network when the repo copy is missing
+    downloaded = cache_dir / CHURN_CSV.name
+    if not downloaded.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        partial = downloaded.with_suffix(".part")
+        with urllib.request.urlopen(url) as response, open(partial, "wb") as handle:
+            shutil.copyfileobj(response, handle)
+        partial.replace(downloaded)
+    return downloaded
+
+
+def load_churn(path=None, cache_dir=None, use_cache=True, url=CHURN_URL):
+    """
+    Loads the churn dataset used in notebook 2
+
+    Args:
+        path: Optional path to a churn CSV. Defaults to `data/causal_churn.csv`,
+            falling back to downloading `url` into the cache directory.
+        cache_dir: Optional directory for parsed caches (see `default_cache_dir`)
+        use_cache: Bool, set to False to always parse the CSV
+        url: Str, where to download the CSV from if no local copy exists
+
+    Returns: DataFrame with categorical plan/region columns and downcast numerics
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    csv_path = _resolve_csv(path, cache_dir, url)
+
+    if not use_cache:
+        return optimize_dtypes(pd.read_csv(csv_path), CHURN_CATEGORICALS)
+
+    suffix = ".parquet" if _have_pyarrow() else ".pkl"
+    key = f"{csv_path.stem}-v{_CACHE_VERSION}-{file_digest(csv_path)[:16]}"
+    cache_path = cache_dir / f"{key}{suffix}"
+
+    if cache_path.exists():
+        if suffix == ".parquet":
+            return pd.read_parquet(cache_path)
+        return pd.read_pickle(cache_path)
+
+    df = optimize_dtypes(pd.read_csv(csv_path), CHURN_CATEGORICALS)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        partial = cache_path.with_suffix(suffix + ".part")
+        if suffix == ".parquet":
+            df.to_parquet(partial, index=False)
+        else:
+            df.to_pickle(partial)
+        partial.replace(cache_path)
+    except OSError:
+        # A read-only cache location shouldn't stop the data from loading
+        pass
+    return df
@@ -0,0 +1,421 @@
+"""
+Bitset d-separation for the tutorial DAGs.
+
+Every node gets a bit position, and sets of nodes are stored as Python ints, so
+unions, intersections and membership tests are single integer operations. The
+ancestor and descendant sets of every node are computed once, in topological
+order, and reused by every query. A d-separation query is then a Bayes-ball
+reachability sweep (Shachter, 1998) over whole frontiers of nodes at a time,
+instead of a path enumeration.
+
+``DSeparationOracle`` answers batches of queries on one graph. Queries that share
+a source and a conditioning set are answered by the same sweep, and the open
+colliders of each conditioning set are worked out once, from the precomputed
+ancestor sets.
+
+``BitDAG.from_graph`` accepts a ``StructuralCausalModel`` (through its ``.cgm``),
+a ``CausalGraphicalModel`` from ``causal_tutorial.dag`` or
+``causalgraphicalmodels``, a networkx ``DiGraph`` or a plain list of
+``(parent, child)`` edges.
+"""
+
+from causal_tutorial.dag import topological_order
+
+
+def _graph_edges(graph):
+    """
+    (nodes, edges) of any of the graph types accepted by `BitDAG.from_graph`
+    """
+    graph = getattr(graph, "cgm", graph)
+    # causalgraphicalmodels keeps its networkx graph in `.dag`
+    graph = getattr(graph, "dag", graph)
+    if hasattr(graph, "nodes") and hasattr(graph, "edges"):
+        return list(graph.nodes), list(graph.edges)
+    edges = [tuple(edge) for edge in graph]
+    return [node for edge in edges for node in edge], edges
+
+
+def iter_bits(mask):
+    """
+    Positions of the set bits of `mask`, lowest first
+
+    Args:
+        mask: Non-negative int
+
+    Returns: Generator of int
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitDAG:
+    """
+    A DAG whose node sets are bitmasks, with precomputed ancestor and descendant sets
+
+    Args:
+        nodes: Iterable of node names
+        edges: Iterable of (parent, child) tuples
+
+    Attributes:
+        nodes: Tuple of node names, the i-th name being bit i
+        index: Dict mapping node name to its bit position
+        parents, children: Lists of bitmasks, one per node
+        ancestors_of, descendants_of: Lists of bitmasks, one per node, excluding
+            the node itself
+    """
+
+    def __init__(self, nodes, edges):
+        edges = [(a, b) for a, b in edges]
+        self.nodes = tuple(dict.fromkeys([*nodes, *(n for e in edges for n in e)]))
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.parents = [0] * len(self.nodes)
+        self.children = [0] * len(self.nodes)
+        for a, b in edges:
+            self.parents[self.index[b]] |= 1 << self.index[a]
+            self.children[self.index[a]] |= 1 << self.index[b]
+
+        self.order = self._topological_order()
+        self.ancestors_of = [0] * len(self.nodes)
+        for i in self.order:
+            for p in iter_bits(self.parents[i]):
+                self.ancestors_of[i] |= self.ancestors_of[p] | (1 << p)
+        self.descendants_of = [0] * len(self.nodes)
+        for i in reversed(self.order):
+            for c in iter_bits(self.children[i]):
+                self.descendants_of[i] |= self.descendants_of[c] | (1 << c)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds a BitDAG from an SCM, a causal graphical model, a networkx DiGraph or
+        an edge list
+
+        Returns: BitDAG
+        """
+        if isinstance(graph, cls):
+            return graph
+        return cls(*_graph_edges(graph))
+
+    def __repr__(self):
+        n_edges = sum(mask.bit_count() for mask in self.parents)
+        return f"{self.__class__.__name__}(nodes={len(self.nodes)}, edges={n_edges})"
+
+    def _topological_order(self):
+        parents = {
+            node: [self.nodes[p] for p in iter_bits(mask)]
+            for node, mask in zip(self.nodes, self.parents)
+        }
+        return [self.index[node] for node in topological_order(parents)]
+
+    def mask(self, nodes):
+        """
+        Bitmask of a node name or an iterable of node names
+
+        Node names are looked up first, so integer or tuple names are never
+        mistaken for a mask or a collection.
+
+        Returns: Int
+        """
+        if nodes is None:
+            return 0
+        if _hashable(nodes) and nodes in self.index:
+            return 1 << self.index[nodes]
+        if isinstance(nodes, str) or not _iterable(nodes):
+            nodes = [nodes]
+        mask = 0
+        for node in nodes:
+            try:
+                mask |= 1 << self.index[node]
+            except KeyError:
+                raise ValueError(f"'{node}' is not in the graph") from None
+        return mask
+
+    def names(self, mask):
+        """
+        Node names of the set bits of `mask`, in node order
+
+        Returns: Tuple of str
+        """
+        return tuple(self.nodes[i] for i in iter_bits(mask))
+
+    def ancestors(self, mask):
+        """
+        Union of the ancestors of every node in `mask`, excluding the nodes themselves
+        unless they are ancestors of each other
+
+        Returns: Int
+        """
+        out = 0
+        for i in iter_bits(mask):
+            out |= self.ancestors_of[i]
+        return out
+
+    def descendants(self, mask):
+        """
+        Union of the descendants of every node in `mask`
+
+        Returns: Int
+        """
+        out = 0
+        for i in iter_bits(mask):
+            out |= self.descendants_of[i]
+        return out
+
+    def _spread(self, mask, neighbours):
+        # Hot loop of every query, so `iter_bits` is inlined
+        out = 0
+        while mask:
+            low = mask & -mask
+            out |= neighbours[low.bit_length() - 1]
+            mask ^= low
+        return out
+
+    def reachable(self, x, z=0, cut=0, within=None):
+        """
+        Nodes d-connected to `x` given `z`
+
+        A Bayes-ball sweep: a node entered from a child passes the ball on to its
+        parents and children unless it is conditioned on, and a node entered from
+        a parent passes it to its children unless conditioned on, or back up to its
+        parents when it is a collider with a conditioned-on descendant.
+
+        Args:
+            x: Bitmask of the source nodes
+            z: Bitmask of the conditioning set
+            cut: Bitmask of nodes whose outgoing edges are ignored, e.g. the
+                treatment when only backdoor paths are of interest
+            within: Optional bitmask of the only nodes the sweep may visit. Passing
+                the ancestors of x, y and z keeps a query about y exact while
+                skipping the rest of the graph.
+
+        Returns: Int, bitmask of the reachable nodes outside `z`
+        """
+        # Colliders are open when they are in z or have a descendant in z. Cutting
+        # edges only changes that when z holds descendants of the cut nodes.
+        if cut and z & self.descendants(cut):
+            opens = frontier = z
+            while frontier:
+                frontier = self._spread(frontier, self.parents) & ~cut & ~opens
+                opens |= frontier
+        else:
+            opens = z | self.ancestors(z)
+        return self._sweep(x, z, opens, cut, within)
+
+    def _sweep(self, x, z, opens, cut=0, within=None):
+        keep = ~cut if within is None else within & ~cut
+        up = x  # entered from a child, or a source
+        down = 0  # entered from a parent
+        seen_up = seen_down = 0
+        while up or down:
+            seen_up |= up
+            seen_down |= down
+            pass_up = up & ~z
+            new_up = self._spread(pass_up | (down & opens), self.parents) & keep
+            new_down = self._spread((pass_up | (down & ~z)) & ~cut, self.children)
+            if within is not None:
+                new_down &= within
+            up = new_up & ~seen_up
+            down = new_down & ~seen_down
+        return (seen_up | seen_down) & ~z
+
+    def d_separated(self, x, y, z=()):
+        """
+        Whether every path between `x` and `y` is blocked by `z`
+
+        Args:
+            x: Node name or iterable of node names
+            y: Node name or iterable of node names
+            z: Optional node name or iterable of node names
+
+        Returns: Bool
+        """
+        x, y, z = self.mask(x), self.mask(y), self.mask(z)
+        relevant = x | y | z
+        relevant |= self.ancestors(relevant)
+        return not self.reachable(x & ~z, z, within=relevant) & y
+
+
+def bitmatrix(rows, n_cols):
+    """
+    Unpacks a list of bitmasks into a boolean matrix
+
+    Args:
+        rows: List of non-negative ints
+        n_cols: Int, number of bits per row
+
+    Returns: Boolean array of shape (len(rows), n_cols), entry [i, j] being bit j
+        of rows[i]
+    """
+    import numpy as np
+
+    n_bytes = max(1, (n_cols + 7) // 8)
+    packed = b"".join(row.to_bytes(n_bytes, "little") for row in rows)
+    bits = np.unpackbits(
+        np.frombuffer(packed, dtype=np.uint8).reshape(len(rows), n_bytes),
+        axis=1,
+        bitorder="little",
+    )
+    return bits[:, :n_cols].astype(bool)
+
+
+class DSeparationOracle:
+    """
+    Batched d-separation queries against one graph
+
+    The graph's ancestor and descendant bitmatrices are built once. For every
+    conditioning set the oracle remembers which colliders it opens, and for every
+    (source, conditioning set) it remembers the full set of d-connected nodes, so
+    asking about many targets, or asking the same question again, costs a few
+    integer operations.
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, networkx DiGraph,
+            edge list or BitDAG
+        cache_size: Int, number of (source, conditioning set) sweeps to keep
+
+    Attributes:
+        dag: BitDAG
+    """
+
+    def __init__(self, graph, cache_size=65_536):
+        self.dag = BitDAG.from_graph(graph)
+        self.cache_size = cache_size
+        self._opens = {}
+        self._reach = {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.dag!r})"
+
+    @property
+    def nodes(self):
+        return self.dag.nodes
+
+    def ancestor_matrix(self):
+        """
+        Boolean matrix whose entry [i, j] says that node j is an ancestor of node i
+
+        Returns: Array of shape (n_nodes, n_nodes), rows and columns following `nodes`
+        """
+        return bitmatrix(self.dag.ancestors_of, len(self.nodes))
+
+    def descendant_matrix(self):
+        """
+        Boolean matrix whose entry [i, j] says that node j is a descendant of node i
+
+        Returns: Array of shape (n_nodes, n_nodes), rows and columns following `nodes`
+        """
+        return bitmatrix(self.dag.descendants_of, len(self.nodes))
+
+    def connected(self, x, z=0):
+        """
+        Bitmask of every node d-connected to `x` given `z`
+
+        Args:
+            x: Bitmask of the source nodes
+            z: Bitmask of the conditioning set
+
+        Returns: Int
+        """
+        key = (x & ~z, z)
+        reach = self._reach.get(key)
+        if reach is None:
+            opens = self._opens.get(z)
+            if opens is None:
+                opens = self._opens[z] = z | self.dag.ancestors(z)
+            reach = self.dag._sweep(key[0], z, opens)
+            if len(self._reach) >= self.cache_size:
+                # Plain dicts keep insertion order, so this drops the oldest sweep
+                del self._reach[next(iter(self._reach))]
+            self._reach[key] = reach
+        return reach
+
+    def d_separated(self, x, y, z=()):
+        """
+        Whether every path between `x` and `y` is blocked by `z`
+
+        Args:
+            x: Node name or iterable of node names
+            y: Node name or iterable of node names
+            z: Optional node name or iterable of node names
+
+        Returns: Bool
+        """
+        dag = self.dag
+        return not self.connected(dag.mask(x), dag.mask(z)) & dag.mask(y)
+
+    def query(self, queries):
+        """
+        Answers many (x, y, z) d-separation queries
+
+        Queries are grouped by (x, z), so every group costs a single sweep no
+        matter how many targets it asks about.
+
+        Args:
+            queries: Iterable of (x, y) or (x, y, z) tuples, each element being a
+                node name or an iterable of node names
+
+        Returns: List of bool, one per query
+        """
+        dag = self.dag
+        masks = []
+        for query in queries:
+            x, y, *rest = query
+            masks.append((dag.mask(x), dag.mask(y), dag.mask(rest[0] if rest else ())))
+        # Visit each (x, z) group together so the sweeps stay in the cache
+        order = sorted(range(len(masks)), key=lambda i: (masks[i][2], masks[i][0]))
+        out = [False] * len(masks)
+        for i in order:
+            x, y, z = masks[i]
+            out[i] = not self.connected(x, z) & y
+        return out
+
+    def separation_matrix(self, z=()):
+        """
+        Pairwise d-separation of every node given one conditioning set
+
+        Args:
+            z: Optional node name or iterable of node names
+
+        Returns: Boolean array of shape (n_nodes, n_nodes) whose entry [i, j] says
+            that nodes i and j are d-separated by `z`. Rows and columns of nodes
+            in `z` are all True.
+        """
+        z = self.dag.mask(z)
+        rows = []
+        for i in range(len(self.nodes)):
+            reach = 0 if z >> i & 1 else self.connected(1 << i, z)
+            rows.append(~reach & ((1 << len(self.nodes)) - 1))
+        return bitmatrix(rows, len(self.nodes))
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _iterable(value):
+    try:
+        iter(value)
+    except TypeError:
+        return False
+    return True
+
+
+def d_separated(graph, x, y, z=()):
+    """
+    Whether `x` and `y` are d-separated by `z` in `graph`
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, networkx DiGraph,
+            edge list or BitDAG
+        x, y: Node name or iterable of node names
+        z: Optional node name or iterable of node names
+
+    Returns: Bool
+    """
+    return BitDAG.from_graph(graph).d_separated(x, y, z)
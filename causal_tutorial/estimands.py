@@ -0,0 +1,304 @@
+"""
+DoWhy identification done once per graph, and subgroup effects fanned out from it.
+
+Notebook 3's subgroup exercise builds a brand-new ``CausalModel`` for the
+Engineering rows and calls ``identify_effect`` again, even though the causal
+graph hasn't changed. With hundreds of segments, re-parsing the graph and
+re-running identification for every one of them is pure overhead: the estimand
+depends on the graph, the treatment, the outcome and which columns are observed,
+not on which rows are in the data.
+
+``identify_effect`` keys each identification by a hash of the graph's canonical
+form plus those settings and keeps the result in a module-level cache.
+``estimate_effect`` runs a DoWhy estimator on any DataFrame against a cached
+estimand, without a ``CausalModel``. ``subgroup_effects`` identifies once and
+estimates every level of a grouping column, such as ``department``, on a
+process pool, returning one tidy row per group.
+
+DoWhy is imported lazily, so importing this module stays cheap.
+"""
+
+import copy
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+_ESTIMAND_CACHE = {}
+_LOCK = threading.Lock()
+
+# Populated in each worker process by `_init_worker`
+_WORKER_STATE = {}
+
+
+def graph_hash(graph):
+    """
+    Hash of a causal graph's canonical form
+
+    DOT and GML strings are compared line by line, ignoring indentation, blank
+    lines and statement order; networkx graphs by their sorted nodes and edges.
+
+    Args:
+        graph: DOT or GML string, or networkx graph, as accepted by CausalModel
+
+    Returns: Str, hex digest
+    """
+    if isinstance(graph, str):
+        lines = sorted(line.strip() for line in graph.splitlines() if line.strip())
+        canonical = "\n".join(lines)
+    else:
+        nodes = sorted(map(str, graph.nodes))
+        edges = sorted((str(a), str(b)) for a, b in graph.edges)
+        canonical = repr((nodes, edges))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def identify_effect(
+    data, graph, treatment, outcome, proceed_when_unidentifiable=True, **kwargs
+):
+    """
+    The DoWhy estimand for treatment -> outcome, identified once per graph
+
+    Args:
+        data: DataFrame, only its columns are used for the cache key
+        graph: DOT or GML string, or networkx graph
+        treatment: Str, name of the treatment column
+        outcome: Str, name of the outcome column
+        proceed_when_unidentifiable: Bool, passed on to
+            `CausalModel.identify_effect`
+        **kwargs: Passed on to `CausalModel.identify_effect`
+
+    Returns: Tuple (estimand, effect_modifiers): the cached IdentifiedEstimand
+        (treat it as read-only) and the list of effect modifiers of the graph
+    """
+    key = (
+        graph_hash(graph),
+        treatment,
+        outcome,
+        tuple(sorted(map(str, data.columns))),
+        proceed_when_unidentifiable,
+        tuple(sorted(kwargs.items())),
+    )
+    with _LOCK:
+        hit = _ESTIMAND_CACHE.get(key)
+    if hit is not None:
+        return hit
+
+    from dowhy import CausalModel
+
+    # Identification only looks at the graph and the column names
+    model = CausalModel(
+        data=data.head(0), treatment=treatment, outcome=outcome, graph=graph
+    )
+    estimand = model.identify_effect(
+        proceed_when_unidentifiable=proceed_when_unidentifiable, **kwargs
+    )
+    result = (estimand, list(model.get_effect_modifiers()))
+    with _LOCK:
+        return _ESTIMAND_CACHE.setdefault(key, result)
+
+
+def clear_estimand_cache():
+    """
+    Empties the cache used by `identify_effect`
+    """
+    with _LOCK:
+        _ESTIMAND_CACHE.clear()
+
+
+def estimate_effect(
+    data,
+    estimand,
+    method_name,
+    effect_modifiers=(),
+    method_params=None,
+    test_significance=False,
+    confidence_intervals=False,
+    target_units="ate",
+):
+    """
+    Runs one of DoWhy's own estimators on `data` against an identified estimand
+
+    Does what `CausalModel.estimate_effect` does, for any DataFrame with the
+    graph's columns, without building a CausalModel. Propensity score
+    estimators get their scores from the shared cache of
+    `causal_tutorial.propensity` instead of fitting their own model.
+
+    Args:
+        data: DataFrame
+        estimand: IdentifiedEstimand, e.g. from `identify_effect`
+        method_name: Str, a two-part DoWhy method such as
+            "backdoor.linear_regression" or "backdoor.propensity_score_matching"
+        effect_modifiers: Iterable of str, effect modifier columns
+        method_params: Optional dict with "init_params" and "fit_params" dicts,
+            as in `CausalModel.estimate_effect`
+        test_significance: Bool, run the estimator's significance test
+        confidence_intervals: Bool, compute confidence intervals
+        target_units: Str, "ate", "att" or "atc"
+
+    Returns: CausalEstimate
+    """
+    from dowhy.causal_estimator import estimate_effect as dowhy_estimate_effect
+    from dowhy.causal_estimators import get_class_object
+
+    parts = method_name.split(".")
+    if len(parts) != 2:
+        raise ValueError(
+            f"Expected a method like 'backdoor.linear_regression', got '{method_name}'"
+        )
+    identifier_name, estimator_name = parts
+    method_params = dict(method_params or {})
+    # Estimators keep a reference to the estimand and set its identifier method
+    estimand = copy.deepcopy(estimand)
+    estimand.set_identifier_method(identifier_name)
+    estimator = get_class_object(estimator_name + "_estimator")(
+        estimand,
+        test_significance=test_significance,
+        confidence_intervals=confidence_intervals,
+        **method_params.get("init_params", {}),
+    )
+    from causal_tutorial.propensity import estimator_data
+
+    return dowhy_estimate_effect(
+        estimator_data(data, estimator),
+        estimand.treatment_variable,
+        estimand.outcome_variable,
+        identifier_name,
+        estimator,
+        target_units=target_units,
+        effect_modifiers=list(effect_modifiers),
+        method_params=method_params,
+    )
+
+
+def _init_worker(data, estimand, settings):
+    _WORKER_STATE.update(data=data, estimand=estimand, settings=settings)
+
+
+def _estimate_group(task):
+    level, rows = task
+    data = _WORKER_STATE["data"].iloc[rows]
+    settings = _WORKER_STATE["settings"]
+    treated = data[settings["treatment"]].to_numpy()
+    row = {
+        "level": level,
+        "n": len(data),
+        "n_treated": int(np.count_nonzero(treated)),
+        "estimate": np.nan,
+        "ci_lower": np.nan,
+        "ci_upper": np.nan,
+        "error": None,
+    }
+    if row["n_treated"] in (0, row["n"]):
+        row["error"] = "only one treatment arm"
+        return row
+    try:
+        estimate = estimate_effect(
+            data,
+            _WORKER_STATE["estimand"],
+            settings["method_name"],
+            effect_modifiers=settings["effect_modifiers"],
+            method_params=settings["method_params"],
+            confidence_intervals=settings["confidence_intervals"],
+        )
+    except Exception as err:  # noqa: BLE001 - one bad segment shouldn't sink the rest
+        row["error"] = f"{type(err).__name__}: {err}"
+        return row
+    row["estimate"] = float(estimate.value)
+    if settings["confidence_intervals"]:
+        lower, upper = np.ravel(estimate.get_confidence_intervals())[:2]
+        row["ci_lower"], row["ci_upper"] = float(lower), float(upper)
+    return row
+
+
+def subgroup_effects(
+    data,
+    graph,
+    treatment,
+    outcome,
+    by,
+    method_name="backdoor.linear_regression",
+    method_params=None,
+    confidence_intervals=False,
+    min_size=2,
+    max_workers=None,
+):
+    """
+    Effect of the treatment within every level of one or more grouping columns
+
+    The estimand is identified once (and cached, see `identify_effect`), then
+    each group is estimated on a process pool. The data is sent to every worker
+    once; tasks only carry row positions.
+
+    Args:
+        data: DataFrame with the graph's columns and the grouping columns
+        graph: DOT or GML string, or networkx graph
+        treatment: Str, name of the treatment column
+        outcome: Str, name of the outcome column
+        by: Str or list of str, grouping columns (e.g. "department")
+        method_name: Str, two-part DoWhy estimation method
+        method_params: Optional dict, see `estimate_effect`
+        confidence_intervals: Bool, add ci_lower and ci_upper
+        min_size: Int, groups with fewer rows are reported but not estimated
+        max_workers: Optional int, size of the process pool (defaults to the
+            number of CPUs). Use 1 to estimate every group in this process.
+
+    Returns: DataFrame with one row per group: the grouping columns, n,
+        n_treated, estimate, ci_lower and ci_upper (NaN unless requested) and
+        error (missing, or why the group has no estimate), sorted by group
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    estimand, effect_modifiers = identify_effect(data, graph, treatment, outcome)
+    settings = {
+        "treatment": treatment,
+        "method_name": method_name,
+        "method_params": method_params,
+        "effect_modifiers": effect_modifiers,
+        "confidence_intervals": confidence_intervals,
+    }
+
+    groups = data.groupby(by, sort=True, observed=True, dropna=False).indices
+    tasks = []
+    small = []
+    for level, rows in groups.items():
+        level = level if isinstance(level, tuple) else (level,)
+        (tasks if len(rows) >= min_size else small).append((level, rows))
+
+    if max_workers == 1 or len(tasks) <= 1:
+        _WORKER_STATE.update(data=data, estimand=estimand, settings=settings)
+        try:
+            rows = [_estimate_group(task) for task in tasks]
+        finally:
+            _WORKER_STATE.clear()
+    else:
+        n_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(data, estimand, settings),
+        ) as pool:
+            chunksize = max(1, len(tasks) // (4 * n_workers))
+            rows = list(pool.map(_estimate_group, tasks, chunksize=chunksize))
+
+    for level, positions in small:
+        rows.append(
+            {
+                "level": level,
+                "n": len(positions),
+                "n_treated": int(
+                    np.count_nonzero(data[treatment].to_numpy()[positions])
+                ),
+                "estimate": np.nan,
+                "ci_lower": np.nan,
+                "ci_upper": np.nan,
+                "error": f"fewer than {min_size} rows",
+            }
+        )
+
+    table = pd.DataFrame(rows)
+    levels = pd.DataFrame(table.pop("level").tolist(), columns=by)
+    table = pd.concat([levels, table], axis=1)
+    return table.sort_values(by, kind="stable").reset_index(drop=True)
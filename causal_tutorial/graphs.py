@@ -0,0 +1,25 @@
+"""
+Causal DAGs drawn in the notebooks, kept as plain edge lists.
+
+Notebook 2 draws the churn DAG, reads its confounders off the backdoor
+criterion and tests its implied independencies against the data. All three use
+``CHURN_EDGES``, so the drawing and the analysis can't drift apart.
+"""
+
+# The churn DAG from the whiteboarding session, as (cause, effect) pairs
+CHURN_EDGES = [
+    ("internation_plan", "churn"),
+    ("age", "churn"),
+    ("region", "churn"),
+    ("customer_service_calls", "churn"),
+    ("acct_length", "customer_service_calls"),
+    ("daytime_call_mins", "acct_length"),
+    ("evening_call_mins", "acct_length"),
+    ("nighttime_call_mins", "acct_length"),
+    ("voicemail_plan", "churn"),
+    ("age", "internation_plan"),
+    ("age", "voicemail_plan"),
+    ("region", "internation_plan"),
+    ("region", "voicemail_plan"),
+    ("acct_length", "churn"),
+]
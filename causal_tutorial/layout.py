@@ -0,0 +1,219 @@
+"""
+Pure-Python layered (Sugiyama-style) DAG drawing, used when Graphviz is missing.
+
+The notebooks only ever draw small causal DAGs, so the classic layered recipe
+is plenty: nodes are put on layers by longest path from the roots, edges that
+skip layers are routed through invisible dummy nodes, a few barycenter sweeps
+reduce crossings, and the result is written as an SVG that looks close to
+``dot``'s default output (ellipses, Times 14pt, black arrows). Only the standard
+library is used.
+"""
+
+import hashlib
+from html import escape
+from itertools import pairwise
+
+from causal_tutorial.dag import topological_layers
+
+FONT_SIZE = 14
+NODE_HEIGHT = 36
+LAYER_GAP = 72
+NODE_GAP = 24
+MARGIN = 8
+
+
+def _layers(nodes, edges):
+    parents = {node: [] for node in nodes}
+    for a, b in edges:
+        parents[b].append(a)
+    return topological_layers(parents)
+
+
+def _crossings(upper, lower, links):
+    position = {node: i for i, node in enumerate(lower)}
+    ends = [(i, position[b]) for i, a in enumerate(upper) for b in links.get(a, ())]
+    return sum(
+        1
+        for k, (a1, b1) in enumerate(ends)
+        for a2, b2 in ends[k + 1 :]
+        if (a1 - a2) * (b1 - b2) < 0
+    )
+
+
+def layered_layout(nodes, edges, labels=None, sweeps=8):
+    """
+    Positions for a layered drawing of a DAG
+
+    Args:
+        nodes: Iterable of node names, in the order used to break ties
+        edges: Iterable of (parent, child) tuples
+        labels: Optional dict mapping node name to its displayed text
+        sweeps: Int, number of down-and-up barycenter passes
+
+    Returns: Tuple (positions, widths, routes, size). `positions` maps every node
+        to the (x, y) of its center, `widths` maps it to its width, `routes` maps
+        every edge to the list of points it passes through, and `size` is the
+        (width, height) of the drawing.
+    """
+    nodes = list(dict.fromkeys([*nodes, *(n for e in edges for n in e)]))
+    edges = list(dict.fromkeys(edges))
+    labels = labels or {}
+    layer = _layers(nodes, edges)
+
+    # Split edges that skip layers into chains through dummy nodes
+    n_layers = max(layer.values(), default=-1) + 1
+    rows = [[] for _ in range(n_layers)]
+    for node in nodes:
+        rows[layer[node]].append(node)
+    down = {}
+    chains = {}
+    for a, b in edges:
+        chain = [a]
+        for depth in range(layer[a] + 1, layer[b]):
+            dummy = ("dummy", a, b, depth)
+            rows[depth].append(dummy)
+            chain.append(dummy)
+        chain.append(b)
+        chains[a, b] = chain
+        for u, v in pairwise(chain):
+            down.setdefault(u, []).append(v)
+    up = {}
+    for u, children in down.items():
+        for v in children:
+            up.setdefault(v, []).append(u)
+
+    def total_crossings():
+        return sum(_crossings(rows[i], rows[i + 1], down) for i in range(n_layers - 1))
+
+    def reorder(row, neighbour_row, links):
+        position = {node: i for i, node in enumerate(neighbour_row)}
+        current = {node: i for i, node in enumerate(row)}
+
+        def barycenter(node):
+            linked = [position[n] for n in links.get(node, ())]
+            return sum(linked) / len(linked) if linked else current[node]
+
+        row.sort(key=lambda node: (barycenter(node), current[node]))
+
+    best = [list(row) for row in rows]
+    best_crossings = total_crossings()
+    for _ in range(sweeps):
+        if not best_crossings:
+            break
+        for i in range(1, n_layers):
+            reorder(rows[i], rows[i - 1], up)
+        for i in range(n_layers - 2, -1, -1):
+            reorder(rows[i], rows[i + 1], down)
+        crossings = total_crossings()
+        if crossings < best_crossings:
+            best, best_crossings = [list(row) for row in rows], crossings
+    rows = best
+
+    widths = {}
+    for row in rows:
+        for node in row:
+            if isinstance(node, tuple) and node[0] == "dummy":
+                widths[node] = 0
+            else:
+                text = str(labels.get(node, node))
+                widths[node] = max(54, int(len(text) * FONT_SIZE * 0.55) + 24)
+    row_widths = [
+        sum(widths[n] for n in row) + NODE_GAP * max(len(row) - 1, 0) for row in rows
+    ]
+    width = max(row_widths, default=0) + 2 * MARGIN
+    positions = {}
+    for depth, (row, row_width) in enumerate(zip(rows, row_widths)):
+        x = (width - row_width) / 2
+        y = MARGIN + NODE_HEIGHT / 2 + depth * LAYER_GAP
+        for node in row:
+            positions[node] = (x + widths[node] / 2, y)
+            x += widths[node] + NODE_GAP
+    height = 2 * MARGIN + NODE_HEIGHT + max(n_layers - 1, 0) * LAYER_GAP
+
+    # Pull every node towards the mean x of its neighbours, keeping the order
+    # within each layer and the minimum gap between neighbours
+    xs = {node: x for node, (x, _) in positions.items()}
+    for _ in range(sweeps):
+        for row in rows:
+            wanted = []
+            for node in row:
+                linked = [xs[n] for n in (*up.get(node, ()), *down.get(node, ()))]
+                wanted.append(sum(linked) / len(linked) if linked else xs[node])
+            for k in range(1, len(row)):
+                gap = (widths[row[k - 1]] + widths[row[k]]) / 2 + NODE_GAP
+                wanted[k] = max(wanted[k], wanted[k - 1] + gap)
+            # Shift the whole row so it sits around the same center as wanted
+            mean_shift = sum(xs[n] for n in row) / len(row) - sum(wanted) / len(row)
+            for node, x in zip(row, wanted):
+                xs[node] = (x + mean_shift + xs[node]) / 2
+    left = min((xs[n] - widths[n] / 2 for n in xs), default=0)
+    right = max((xs[n] + widths[n] / 2 for n in xs), default=0)
+    width = right - left + 2 * MARGIN
+    positions = {n: (xs[n] - left + MARGIN, y) for n, (_, y) in positions.items()}
+
+    routes = {}
+    for (a, b), chain in chains.items():
+        (xa, ya), (xb, yb) = positions[a], positions[b]
+        points = [(xa, ya + NODE_HEIGHT / 2)]
+        points.extend(positions[dummy] for dummy in chain[1:-1])
+        points.append((xb, yb - NODE_HEIGHT / 2))
+        routes[a, b] = points
+    node_positions = {n: positions[n] for n in nodes}
+    return node_positions, {n: widths[n] for n in nodes}, routes, (width, height)
+
+
+def layered_svg(nodes, edges, labels=None, peripheries=None, title=None):
+    """
+    SVG drawing of a DAG, laid out with `layered_layout`
+
+    Args:
+        nodes: Iterable of node names
+        edges: Iterable of (parent, child) tuples
+        labels: Optional dict mapping node name to its displayed text
+        peripheries: Optional dict mapping node name to its number of outlines,
+            2 giving the double ellipse used for intervened-on nodes
+        title: Optional str, SVG title
+
+    Returns: Str
+    """
+    labels = labels or {}
+    peripheries = peripheries or {}
+    positions, widths, routes, (width, height) = layered_layout(nodes, edges, labels)
+
+    header = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}pt" '
+        f'height="{height:.0f}pt" viewBox="0 0 {width:.0f} {height:.0f}">'
+    )
+    # Several SVGs inlined in one page share an id namespace, so the marker id
+    # is derived from the drawing: different graphs never collide, and the same
+    # graph still renders to the same (cacheable) text
+    drawing = repr((list(positions.items()), list(routes), labels, peripheries))
+    marker = f"arrow-{hashlib.sha1(drawing.encode()).hexdigest()[:12]}"
+    arrow = (
+        f'<defs><marker id="{marker}" viewBox="0 0 10 10" refX="10" refY="5" '
+        'markerWidth="10" markerHeight="10" orient="auto" '
+        'markerUnits="userSpaceOnUse"><path d="M0,1 L10,5 L0,9 z"/></marker></defs>'
+    )
+    parts = [header, arrow]
+    if title:
+        parts.append(f"<title>{escape(str(title))}</title>")
+    parts.append('<g font-family="Times,serif" font-size="14">')
+    for points in routes.values():
+        path = " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+        parts.append(
+            f'<polyline points="{path}" fill="none" stroke="black" '
+            f'marker-end="url(#{marker})"/>'
+        )
+    for node, (x, y) in positions.items():
+        rx, ry = widths[node] / 2, NODE_HEIGHT / 2
+        for k in range(int(peripheries.get(node, 1))):
+            parts.append(
+                f'<ellipse cx="{x:.1f}" cy="{y:.1f}" rx="{rx + 4 * k:.1f}" '
+                f'ry="{ry + 4 * k:.1f}" fill="none" stroke="black"/>'
+            )
+        parts.append(
+            f'<text x="{x:.1f}" y="{y:.1f}" text-anchor="middle" '
+            f'dominant-baseline="central">{escape(str(labels.get(node, node)))}</text>'
+        )
+    parts.append("</g></svg>")
+    return "\n".join(parts)
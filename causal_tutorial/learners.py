@@ -0,0 +1,152 @@
+"""
+Pluggable outcome models for the meta-learners of notebook 2.
+
+Notebook 2 hard-codes a ``GradientBoostingClassifier`` on one-hot encoded
+features. That model grows its trees one exact split search at a time on a
+single core. ``HistGradientBoostingClassifier`` bins every feature into at most
+255 buckets once, builds the histograms on all cores, and splits on a
+categorical column like ``region`` directly, so the dummies aren't needed.
+
+Learners are registered by name, and ``make_learner`` builds a fresh unfitted
+one from a name and keyword arguments. Every factory takes
+``categorical_features`` (a boolean mask over the feature columns); learners
+without native categorical support reject it, since they would silently treat
+the codes as ordered numbers. Factories also take ``regression``, for the
+second-stage effect models of the X-learner, which predict continuous values.
+"""
+
+from sklearn.ensemble import (
+    GradientBoostingClassifier,
+    GradientBoostingRegressor,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+)
+from sklearn.linear_model import LinearRegression, LogisticRegression
+
+LEARNERS = {}
+
+
+def register_learner(name):
+    """
+    Decorator adding an outcome learner factory to `LEARNERS`
+
+    The factory must accept `categorical_features`, `random_state` and
+    `regression` keyword arguments and return an unfitted scikit-learn style
+    classifier, or a regressor when `regression` is True.
+
+    Args:
+        name: Str, name the learner is looked up by
+
+    Returns: The decorator
+    """
+
+    def decorator(factory):
+        LEARNERS[name] = factory
+        return factory
+
+    return decorator
+
+
+def _no_categorical(name, categorical_features):
+    if categorical_features is not None and any(categorical_features):
+        raise ValueError(
+            f"The '{name}' learner has no native categorical support, "
+            "one-hot encode the categorical columns instead"
+        )
+
+
+@register_learner("gradient_boosting")
+def gradient_boosting(
+    categorical_features=None, random_state=None, regression=False, **params
+):
+    """
+    sklearn's exact-split GradientBoostingClassifier, as used in notebook 2
+    """
+    _no_categorical("gradient_boosting", categorical_features)
+    cls = GradientBoostingRegressor if regression else GradientBoostingClassifier
+    return cls(random_state=random_state, **params)
+
+
+@register_learner("hist_gradient_boosting")
+def hist_gradient_boosting(
+    categorical_features=None, random_state=None, regression=False, **params
+):
+    """
+    Histogram-binned, multi-threaded HistGradientBoostingClassifier
+
+    Categorical columns must hold non-negative integer codes (NaN for missing),
+    as written by `ChurnPreprocessor(native_categorical=...)`.
+    """
+    if categorical_features is not None and not any(categorical_features):
+        categorical_features = None
+    cls = (
+        HistGradientBoostingRegressor if regression else HistGradientBoostingClassifier
+    )
+    return cls(
+        categorical_features=categorical_features,
+        random_state=random_state,
+        **params,
+    )
+
+
+@register_learner("logistic")
+def logistic(categorical_features=None, random_state=None, regression=False, **params):
+    """
+    LogisticRegression, a fast linear baseline (LinearRegression for regression)
+    """
+    _no_categorical("logistic", categorical_features)
+    if regression:
+        return LinearRegression(**params)
+    return LogisticRegression(random_state=random_state, **params)
+
+
+def make_learner(
+    name, categorical_features=None, random_state=None, regression=False, **params
+):
+    """
+    A fresh, unfitted outcome learner
+
+    Args:
+        name: Str, one of `LEARNERS`
+        categorical_features: Optional boolean sequence, True for the feature
+            columns holding category codes
+        random_state: Optional int seed
+        regression: Bool, build the regressor variant instead of the classifier
+        **params: Passed on to the estimator
+
+    Returns: Unfitted classifier or regressor
+    """
+    if name not in LEARNERS:
+        raise ValueError(f"Unknown learner '{name}', expected one of {list(LEARNERS)}")
+    return LEARNERS[name](
+        categorical_features=categorical_features,
+        random_state=random_state,
+        regression=regression,
+        **params,
+    )
+
+
+def resolve_learner(
+    model, features, categorical=(), random_state=None, regression=False
+):
+    """
+    `model` itself, or a new learner when `model` is a learner name
+
+    Args:
+        model: Scikit-learn style estimator, or a name in `LEARNERS`
+        features: List of str, the feature columns the learner will see
+        categorical: Iterable of str, feature columns holding category codes
+        random_state: Optional int seed for a named learner
+        regression: Bool, build the regressor variant of a named learner
+
+    Returns: Estimator
+    """
+    if not isinstance(model, str):
+        return model
+    categorical = set(categorical)
+    return make_learner(
+        model,
+        categorical_features=[f in categorical for f in features],
+        random_state=random_state,
+        regression=regression,
+    )
@@ -0,0 +1,407 @@
+"""
+Propensity score and Mahalanobis matching that scales to large cohorts.
+
+DoWhy's ``backdoor.propensity_score_matching`` in notebook 3 fits a nearest
+neighbour search over the 1-D propensity score without a sorted index. On one
+dimension, sorting is all the index that is needed:
+
+* the control scores are sorted once and every treated unit finds its place
+  with one vectorized ``np.searchsorted``. Its k nearest controls are then
+  collected by moving a left and a right pointer outwards, k steps for all
+  treated units at once;
+* matching without replacement is greedy nearest-available: used controls are
+  skipped through "next free slot" pointers with path compression, so each
+  match costs amortized near-constant time;
+* a caliper (in score units, or in standard deviations of the logit score, as
+  is common) drops matches that are too far apart.
+
+Multivariate matching on the Mahalanobis distance whitens the covariates with
+the Cholesky factor of their covariance and queries a ``scipy.spatial.cKDTree``
+(or sklearn's ``BallTree`` when asked), where Euclidean distance equals the
+Mahalanobis distance.
+
+``propensity_matching`` takes its scores from the shared propensity model cache
+of ``causal_tutorial.propensity``.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import linalg, spatial
+
+
+@dataclass(frozen=True)
+class MatchResult:
+    """
+    Matched pairs of treated and control units
+
+    Attributes:
+        treated_idx: Int array, row of the treated unit of each pair
+        control_idx: Int array, row of the control unit of each pair
+        distance: Float array, distance within each pair
+        n_treated: Int, number of treated units that were to be matched
+    """
+
+    treated_idx: np.ndarray
+    control_idx: np.ndarray
+    distance: np.ndarray
+    n_treated: int
+
+    @property
+    def n_matched(self):
+        """
+        Number of treated units with at least one match
+        """
+        return int(np.unique(self.treated_idx).size)
+
+    def effect(self, outcome):
+        """
+        Mean over matched treated units of y_treated - mean(y of its controls)
+
+        Args:
+            outcome: 1-D array indexed like the rows that were matched
+
+        Returns: Float, NaN when nothing was matched
+        """
+        outcome = np.asarray(outcome, dtype=np.float64)
+        if not self.treated_idx.size:
+            return float("nan")
+        units, inverse = np.unique(self.treated_idx, return_inverse=True)
+        control_mean = np.bincount(
+            inverse, weights=outcome[self.control_idx]
+        ) / np.bincount(inverse)
+        return float(np.mean(outcome[units] - control_mean))
+
+
+def _logit(p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return np.log(p) - np.log1p(-p)
+
+
+def _nearest_sorted(sorted_values, queries, n_neighbors):
+    """
+    Positions in `sorted_values` of the k nearest values to every query
+
+    Returns: Tuple (positions, distances), both of shape (n_queries, k); -1 and
+        inf where fewer than k values exist
+    """
+    n = sorted_values.size
+    right = np.searchsorted(sorted_values, queries)
+    left = right - 1
+    positions = np.full((queries.size, n_neighbors), -1, dtype=np.int64)
+    distances = np.full((queries.size, n_neighbors), np.inf)
+    for k in range(n_neighbors):
+        left_dist = np.where(
+            left >= 0, queries - sorted_values[np.clip(left, 0, n - 1)], np.inf
+        )
+        right_dist = np.where(
+            right < n, sorted_values[np.clip(right, 0, n - 1)] - queries, np.inf
+        )
+        take_left = left_dist <= right_dist
+        best = np.where(take_left, left_dist, right_dist)
+        found = np.isfinite(best)
+        positions[found, k] = np.where(take_left, left, right)[found]
+        distances[:, k] = best
+        left = np.where(take_left & found, left - 1, left)
+        right = np.where(~take_left & found, right + 1, right)
+    return positions, distances
+
+
+def _find(pointer, i):
+    """
+    Follows "next free slot" pointers from i, compressing the path
+    """
+    root = i
+    while pointer[root] != root:
+        root = pointer[root]
+    while pointer[i] != root:
+        pointer[i], i = root, pointer[i]
+    return root
+
+
+def _greedy_without_replacement(sorted_values, queries, order, caliper):
+    """
+    Nearest still-unused value for each query, visiting queries in `order`
+
+    Returns: Tuple (query index, position, distance) arrays of the matches
+    """
+    n = sorted_values.size
+    # Slot i of `right_free` leads to the first free position >= i (n: none),
+    # slot i + 1 of `left_free` to one plus the last free position <= i (0: none)
+    right_free = np.arange(n + 1)
+    left_free = np.arange(n + 1)
+    starts = np.searchsorted(sorted_values, queries)
+    matched_q, matched_pos, matched_dist = [], [], []
+    for q in order:
+        start = starts[q]
+        value = queries[q]
+        r = _find(right_free, start)
+        l_slot = _find(left_free, start)
+        best, best_dist = -1, np.inf
+        if r < n:
+            best, best_dist = r, sorted_values[r] - value
+        if l_slot > 0 and value - sorted_values[l_slot - 1] < best_dist:
+            best, best_dist = l_slot - 1, value - sorted_values[l_slot - 1]
+        if best < 0 or (caliper is not None and best_dist > caliper):
+            continue
+        right_free[best] = best + 1
+        left_free[best + 1] = best
+        matched_q.append(q)
+        matched_pos.append(best)
+        matched_dist.append(best_dist)
+    return (
+        np.asarray(matched_q, dtype=np.int64),
+        np.asarray(matched_pos, dtype=np.int64),
+        np.asarray(matched_dist, dtype=np.float64),
+    )
+
+
+def match_propensity(
+    scores,
+    treated,
+    n_neighbors=1,
+    caliper=None,
+    caliper_scale="score",
+    replace=True,
+    order="descending",
+):
+    """
+    Matches every treated unit to its nearest controls on the propensity score
+
+    Args:
+        scores: 1-D array of propensity scores, one per row
+        treated: Boolean-like 1-D array, the rows to be matched
+        n_neighbors: Int, controls per treated unit (with replacement only)
+        caliper: Optional float, largest allowed distance
+        caliper_scale: Str, "score" for a caliper in score units, or "logit_sd"
+            for a caliper in standard deviations of the logit score, with the
+            distances computed on the logit scale too
+        replace: Bool, whether a control can be matched more than once
+        order: Str, order treated units pick their control in when matching
+            without replacement: "descending" score (hardest to match first),
+            "ascending", or "random"
+
+    Returns: MatchResult
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    treated = np.asarray(treated).astype(bool)
+    if caliper_scale == "logit_sd":
+        scores = _logit(scores)
+        if caliper is not None:
+            caliper = caliper * scores.std()
+    elif caliper_scale != "score":
+        raise ValueError("caliper_scale must be 'score' or 'logit_sd'")
+
+    treated_rows = np.flatnonzero(treated)
+    control_rows = np.flatnonzero(~treated)
+    sort = np.argsort(scores[control_rows], kind="stable")
+    sorted_rows = control_rows[sort]
+    sorted_scores = scores[sorted_rows]
+    queries = scores[treated_rows]
+
+    if replace:
+        positions, distances = _nearest_sorted(sorted_scores, queries, n_neighbors)
+        keep = positions >= 0
+        if caliper is not None:
+            keep &= distances <= caliper
+        query_idx = np.nonzero(keep)[0]
+        pos, dist = positions[keep], distances[keep]
+    else:
+        if n_neighbors != 1:
+            raise ValueError("Matching without replacement uses one neighbor")
+        if order == "descending":
+            visit = np.argsort(-queries, kind="stable")
+        elif order == "ascending":
+            visit = np.argsort(queries, kind="stable")
+        elif order == "random":
+            visit = np.random.default_rng(0).permutation(queries.size)
+        else:
+            raise ValueError("order must be 'descending', 'ascending' or 'random'")
+        query_idx, pos, dist = _greedy_without_replacement(
+            sorted_scores, queries, visit, caliper
+        )
+        sort_back = np.argsort(query_idx, kind="stable")
+        query_idx, pos, dist = query_idx[sort_back], pos[sort_back], dist[sort_back]
+
+    return MatchResult(
+        treated_idx=treated_rows[query_idx],
+        control_idx=sorted_rows[pos],
+        distance=dist,
+        n_treated=int(treated_rows.size),
+    )
+
+
+def whiten(X, reference=None):
+    """
+    Covariates transformed so Euclidean distance is the Mahalanobis distance
+
+    Args:
+        X: 2-D array of shape (n_rows, n_features)
+        reference: Optional 2-D array whose covariance defines the metric,
+            defaults to X
+
+    Returns: Array like X
+    """
+    X = np.asarray(X, dtype=np.float64)
+    reference = X if reference is None else np.asarray(reference, dtype=np.float64)
+    cov = np.atleast_2d(np.cov(reference, rowvar=False))
+    factor = linalg.cholesky(cov, lower=True)
+    # Solve L z = x for every row, i.e. z = L^-1 x
+    return linalg.solve_triangular(factor, X.T, lower=True).T
+
+
+def match_mahalanobis(X, treated, n_neighbors=1, caliper=None, replace=True, tree="kd"):
+    """
+    Nearest-neighbor matching of treated units on the Mahalanobis distance
+
+    Args:
+        X: 2-D array of covariates, one row per unit
+        treated: Boolean-like 1-D array, the rows to be matched
+        n_neighbors: Int, controls per treated unit (with replacement only)
+        caliper: Optional float, largest allowed Mahalanobis distance
+        replace: Bool, whether a control can be matched more than once
+        tree: Str, "kd" for scipy's cKDTree or "ball" for sklearn's BallTree
+
+    Returns: MatchResult
+    """
+    treated = np.asarray(treated).astype(bool)
+    Z = whiten(X)
+    treated_rows = np.flatnonzero(treated)
+    control_rows = np.flatnonzero(~treated)
+    if tree == "kd":
+        index = spatial.cKDTree(Z[control_rows])
+
+        def query(points, k):
+            distances, positions = index.query(points, k=k, workers=-1)
+            return distances.reshape(len(points), k), positions.reshape(len(points), k)
+
+    elif tree == "ball":
+        from sklearn.neighbors import BallTree
+
+        index = BallTree(Z[control_rows])
+
+        def query(points, k):
+            return index.query(points, k=k)
+
+    else:
+        raise ValueError("tree must be 'kd' or 'ball'")
+
+    n_controls = control_rows.size
+    if replace:
+        k = min(n_neighbors, n_controls)
+        distances, positions = query(Z[treated_rows], k)
+        keep = np.isfinite(distances)
+        if caliper is not None:
+            keep &= distances <= caliper
+        query_idx = np.nonzero(keep)[0]
+        pos, dist = positions[keep], distances[keep]
+    else:
+        if n_neighbors != 1:
+            raise ValueError("Matching without replacement uses one neighbor")
+        used = np.zeros(n_controls, dtype=bool)
+        query_idx, pos, dist = [], [], []
+        k = min(8, n_controls)
+        distances, positions = query(Z[treated_rows], k)
+        # Greedy by closest first candidate; requery deeper when all are taken
+        for q in np.argsort(distances[:, 0], kind="stable"):
+            cand_dist, cand_pos = distances[q], positions[q]
+            depth = k
+            while True:
+                free = ~used[cand_pos]
+                if free.any() or depth >= n_controls:
+                    break
+                depth = min(depth * 4, n_controls)
+                cand_dist, cand_pos = (a[0] for a in query(Z[treated_rows[[q]]], depth))
+            if not free.any():
+                continue
+            first = np.argmax(free)
+            if caliper is not None and cand_dist[first] > caliper:
+                continue
+            used[cand_pos[first]] = True
+            query_idx.append(q)
+            pos.append(cand_pos[first])
+            dist.append(cand_dist[first])
+        order = np.argsort(query_idx, kind="stable")
+        query_idx = np.asarray(query_idx, dtype=np.int64)[order]
+        pos = np.asarray(pos, dtype=np.int64)[order]
+        dist = np.asarray(dist, dtype=np.float64)[order]
+
+    return MatchResult(
+        treated_idx=treated_rows[query_idx],
+        control_idx=control_rows[pos],
+        distance=dist,
+        n_treated=int(treated_rows.size),
+    )
+
+
+def matching_effect(outcome, treated, scores, target_units="ate", **kwargs):
+    """
+    ATT, ATC or ATE by propensity score matching in both directions
+
+    Treated units matched to controls give the ATT; controls matched to treated
+    units give the ATC; the ATE weights the two by group size, like DoWhy's
+    propensity score matching estimator.
+
+    Args:
+        outcome: 1-D array of outcomes
+        treated: Boolean-like 1-D array
+        scores: 1-D array of propensity scores
+        target_units: Str, "att", "atc" or "ate"
+        **kwargs: Passed on to `match_propensity`
+
+    Returns: Float
+    """
+    outcome = np.asarray(outcome, dtype=np.float64)
+    treated = np.asarray(treated).astype(bool)
+    att = atc = 0.0
+    if target_units in ("att", "ate"):
+        att = match_propensity(scores, treated, **kwargs).effect(outcome)
+    if target_units in ("atc", "ate"):
+        # Matching controls to treated units gives y_control - y_treated
+        atc = -match_propensity(scores, ~treated, **kwargs).effect(outcome)
+    if target_units == "att":
+        return att
+    if target_units == "atc":
+        return atc
+    if target_units != "ate":
+        raise ValueError("target_units must be 'att', 'atc' or 'ate'")
+    share = treated.mean()
+    return float(share * att + (1 - share) * atc)
+
+
+def propensity_matching(
+    data,
+    treatment,
+    outcome,
+    confounders,
+    learner="logistic",
+    target_units="ate",
+    **kwargs,
+):
+    """
+    `matching_effect` on the cached propensity model of `confounders`
+
+    The propensity model comes from `causal_tutorial.propensity.fit_propensity`,
+    so it is shared with DoWhy's propensity estimators run on the same data.
+
+    Args:
+        data: DataFrame
+        treatment: Str, name of the binary treatment column
+        outcome: Str, name of the outcome column
+        confounders: Iterable of str, confounder columns
+        learner: See `causal_tutorial.propensity.fit_propensity`
+        target_units: Str, "att", "atc" or "ate"
+        **kwargs: Passed on to `match_propensity`
+
+    Returns: Float
+    """
+    from causal_tutorial.propensity import fit_propensity
+
+    fitted = fit_propensity(data, treatment, confounders, learner=learner)
+    return matching_effect(
+        data[outcome].to_numpy(),
+        data[treatment].to_numpy(),
+        fitted.scores,
+        target_units=target_units,
+        **kwargs,
+    )
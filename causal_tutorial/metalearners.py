@@ -0,0 +1,366 @@
+"""
+Cross-fitted T-learner and X-learner for notebook 2.
+
+The S-learner of ``causal_tutorial.slearner`` puts ``int_plan_yes`` in as one more
+feature, so a tree model can all but ignore it and shrink every individual
+effect towards zero. The learners here fit separate outcome models per
+treatment arm instead:
+
+* the T-learner's effect for a row is mu1(x) - mu0(x), the difference between
+  the treated-arm and control-arm models;
+* the X-learner imputes each row's own effect from the other arm's model
+  (y - mu0(x) for the treated, mu1(x) - y for the controls), regresses those on
+  x within each arm, and blends the two effect models by the propensity score.
+
+Both are K-fold cross-fitted: the models of fold k are trained on the other
+folds, and every training row gets its effect from models that never saw it.
+For the X-learner that includes the outcome models behind the imputed effects,
+which are fitted once per pair of folds.
+All per-fold, per-arm models are independent, so each stage submits them to one
+thread pool at once; scikit-learn's tree learners release the GIL while fitting,
+and the histogram learners add their own OpenMP threads on top.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import KFold
+
+from causal_tutorial.learners import resolve_learner
+from causal_tutorial.slearner import _predict_positive, summarize_effects
+
+
+def _fit(model, X, y):
+    return clone(model).fit(X, y)
+
+
+def _predict_value(model, X):
+    if hasattr(model, "predict_proba"):
+        return _predict_positive(model, X)
+    return model.predict(X)
+
+
+class _CrossFitLearner:
+    """
+    Shared set-up of the cross-fitted meta-learners
+
+    Args:
+        model: Unfitted scikit-learn style classifier for the per-arm outcome
+            models, or the name of a learner in `causal_tutorial.learners`
+        features: List of str, the covariate columns (without the treatment)
+        treatment: Str, name of the binary treatment column
+        n_folds: Int, number of cross-fitting folds, at least 2
+        n_jobs: Optional int, number of threads fitting models at once. Defaults
+            to the number of CPUs.
+        categorical: Iterable of str, feature columns holding category codes,
+            only used for learner names
+        random_state: Optional int seed for the fold split and named learners
+    """
+
+    def __init__(
+        self,
+        model,
+        features,
+        treatment,
+        n_folds=5,
+        n_jobs=None,
+        categorical=(),
+        random_state=None,
+    ):
+        if treatment in features:
+            raise ValueError(
+                f"Treatment column '{treatment}' must not be one of the features"
+            )
+        if n_folds < 2:
+            raise ValueError("n_folds must be at least 2")
+        self.features = list(features)
+        self.treatment = treatment
+        self.n_folds = n_folds
+        self.n_jobs = n_jobs
+        self.categorical = tuple(categorical)
+        self.random_state = random_state
+        self.model = resolve_learner(model, self.features, categorical, random_state)
+
+    def _design(self, df):
+        return df[self.features].to_numpy(dtype=np.float64)
+
+    def _arrays(self, df, outcome):
+        X = self._design(df)
+        treated = df[self.treatment].to_numpy().astype(bool)
+        if treated.all() or not treated.any():
+            raise ValueError("Both treatment arms need at least one row")
+        return X, treated, df[outcome].to_numpy()
+
+    def _pool(self):
+        return ThreadPoolExecutor(max_workers=self.n_jobs or os.cpu_count())
+
+    def _submit_arms(self, pool, model, X, y, treated, train):
+        """
+        Submits fits of `model` on each arm of the rows `train`
+
+        Returns: Tuple of futures (control model, treated model)
+        """
+        arm1 = train[treated[train]]
+        arm0 = train[~treated[train]]
+        if not arm1.size or not arm0.size:
+            raise ValueError(
+                "A cross-fitting training split has no "
+                f"{'treated' if not arm1.size else 'control'} rows, use fewer folds"
+            )
+        return (
+            pool.submit(_fit, model, X[arm0], y[arm0]),
+            pool.submit(_fit, model, X[arm1], y[arm1]),
+        )
+
+    def _fit_arms(self, pool, model, X, y, treated, trains=None):
+        """
+        Fits `model` on each arm of every training split, by default the folds'
+
+        Returns: List of (control model, treated model) futures, one per split
+        """
+        if trains is None:
+            trains = self.train_folds_
+        return [self._submit_arms(pool, model, X, y, treated, t) for t in trains]
+
+    def _split(self, n_rows):
+        folds = KFold(self.n_folds, shuffle=True, random_state=self.random_state)
+        self.train_folds_, self.test_folds_ = [], []
+        for train, test in folds.split(np.empty((n_rows, 1))):
+            self.train_folds_.append(train)
+            self.test_folds_.append(test)
+
+    def _out_of_fold(self, models, X, predict):
+        """
+        Per-row predictions of each arm's model from the fold that held the row out
+
+        Returns: Tuple of arrays (arm 1, arm 0)
+        """
+        out1 = np.empty(X.shape[0], dtype=np.float64)
+        out0 = np.empty(X.shape[0], dtype=np.float64)
+        for (model0, model1), test in zip(models, self.test_folds_):
+            out1[test] = predict(model1, X[test])
+            out0[test] = predict(model0, X[test])
+        return out1, out0
+
+    def _fold_average(self, models, X, predict):
+        """
+        Per-row predictions of each arm averaged over the fold models
+
+        Returns: Tuple of arrays (arm 1, arm 0)
+        """
+        out1 = np.zeros(X.shape[0], dtype=np.float64)
+        out0 = np.zeros(X.shape[0], dtype=np.float64)
+        for model0, model1 in models:
+            out1 += predict(model1, X)
+            out0 += predict(model0, X)
+        return out1 / len(models), out0 / len(models)
+
+    def predict_cate(self, df):
+        """
+        Per-row conditional average treatment effects for new rows
+
+        Every fold's models score the rows and their effects are averaged. Use
+        `cate_` for the rows the learner was fitted on.
+
+        Args:
+            df: DataFrame containing the feature columns
+
+        Returns: Array of shape (n_rows,)
+        """
+        return self._cate(self._design(df))
+
+
+class TLearner(_CrossFitLearner):
+    """
+    One outcome model per treatment arm, cross-fitted
+
+    See `_CrossFitLearner` for the arguments.
+
+    Attributes (after `fit`):
+        models_: List of (control model, treated model) tuples, one per fold
+        mu1_: Array, out-of-fold predicted outcome of each row when treated
+        mu0_: Array, out-of-fold predicted outcome of each row when untreated
+        cate_: Array, out-of-fold effect of each row, mu1_ - mu0_
+    """
+
+    def fit(self, df, outcome):
+        """
+        Fits the per-fold, per-arm outcome models, all at once on a thread pool
+
+        Args:
+            df: DataFrame containing the feature, treatment and outcome columns
+            outcome: Str, name of the binary outcome column
+
+        Returns: self
+        """
+        X, treated, y = self._arrays(df, outcome)
+        self._split(X.shape[0])
+        with self._pool() as pool:
+            futures = self._fit_arms(pool, self.model, X, y, treated)
+            self.models_ = [(f0.result(), f1.result()) for f0, f1 in futures]
+        self.mu1_, self.mu0_ = self._out_of_fold(self.models_, X, _predict_positive)
+        self.cate_ = self.mu1_ - self.mu0_
+        self.treated_ = treated
+        return self
+
+    def _cate(self, X):
+        mu1, mu0 = self._fold_average(self.models_, X, _predict_positive)
+        return mu1 - mu0
+
+    def effects(self):
+        """
+        ATE, ATT and ATC of the fitted rows, from the out-of-fold predictions
+
+        Returns: TreatmentEffects
+        """
+        return summarize_effects(self.mu1_, self.mu0_, self.treated_)
+
+
+class XLearner(_CrossFitLearner):
+    """
+    Künzel et al.'s X-learner, cross-fitted
+
+    Takes the `_CrossFitLearner` arguments plus:
+
+    Args:
+        effect_model: Unfitted scikit-learn style regressor for the imputed
+            effects, or a learner name. Defaults to the regressor variant of
+            `model` when that is a learner name.
+        propensity_model: Optional unfitted classifier (or learner name) for
+            P(treated | x), cross-fitted like the rest. Defaults to the overall
+            share of treated rows.
+
+    The imputation is cross-fitted too: the effect models of fold k are trained
+    on effects imputed by outcome models that never saw fold k either, one per
+    pair of folds, so it takes at least 3 folds.
+
+    Attributes (after `fit`):
+        outcome_models_: Dict mapping each pair of folds (j, k), j < k, to the
+            (control model, treated model) tuple fitted without both folds
+        effect_models_: List of (control-arm, treated-arm) effect regressors per
+            fold
+        propensity_models_: List of propensity classifiers per fold, or None
+        propensity_: Array, out-of-fold propensity score of each row
+        cate_: Array, out-of-fold effect of each row
+    """
+
+    def __init__(
+        self,
+        model,
+        features,
+        treatment,
+        effect_model=None,
+        propensity_model=None,
+        n_folds=5,
+        n_jobs=None,
+        categorical=(),
+        random_state=None,
+    ):
+        super().__init__(
+            model, features, treatment, n_folds, n_jobs, categorical, random_state
+        )
+        if n_folds < 3:
+            raise ValueError("The X-learner needs n_folds of at least 3")
+        if effect_model is None:
+            if not isinstance(model, str):
+                raise ValueError("effect_model is required when model is an estimator")
+            effect_model = model
+        self.effect_model = resolve_learner(
+            effect_model,
+            self.features,
+            self.categorical,
+            self.random_state,
+            regression=True,
+        )
+        self.propensity_model = None
+        if propensity_model is not None:
+            self.propensity_model = resolve_learner(
+                propensity_model, self.features, self.categorical, self.random_state
+            )
+
+    def fit(self, df, outcome):
+        """
+        Fits the outcome, effect and propensity models of every fold
+
+        The outcome models of all pairs of folds (and the propensity models) are
+        fitted together, then the effect models of all folds.
+
+        Args:
+            df: DataFrame containing the feature, treatment and outcome columns
+            outcome: Str, name of the binary outcome column
+
+        Returns: self
+        """
+        X, treated, y = self._arrays(df, outcome)
+        self._split(X.shape[0])
+        fold_of = np.empty(X.shape[0], dtype=np.int64)
+        for k, test in enumerate(self.test_folds_):
+            fold_of[test] = k
+        pairs = list(combinations(range(self.n_folds), 2))
+        pair_trains = [
+            np.flatnonzero((fold_of != j) & (fold_of != k)) for j, k in pairs
+        ]
+        with self._pool() as pool:
+            outcome_futures = self._fit_arms(
+                pool, self.model, X, y, treated, pair_trains
+            )
+            propensity_futures = None
+            if self.propensity_model is not None:
+                propensity_futures = [
+                    pool.submit(_fit, self.propensity_model, X[train], treated[train])
+                    for train in self.train_folds_
+                ]
+            self.outcome_models_ = {
+                pair: (f0.result(), f1.result())
+                for pair, (f0, f1) in zip(pairs, outcome_futures)
+            }
+
+            # Fold k's effect models see rows of every other fold j, each with the
+            # effect imputed by the other arm's model fitted without folds j and k
+            effect_futures = []
+            for k, train in enumerate(self.train_folds_):
+                imputed = np.full(X.shape[0], np.nan)
+                for j, rows in enumerate(self.test_folds_):
+                    if j == k:
+                        continue
+                    model0, model1 = self.outcome_models_[min(j, k), max(j, k)]
+                    imputed[rows] = np.where(
+                        treated[rows],
+                        y[rows] - _predict_positive(model0, X[rows]),
+                        _predict_positive(model1, X[rows]) - y[rows],
+                    )
+                effect_futures.append(
+                    self._submit_arms(
+                        pool, self.effect_model, X, imputed, treated, train
+                    )
+                )
+            self.effect_models_ = [
+                (f0.result(), f1.result()) for f0, f1 in effect_futures
+            ]
+            self.propensity_models_ = None
+            if propensity_futures is not None:
+                self.propensity_models_ = [f.result() for f in propensity_futures]
+
+        tau1, tau0 = self._out_of_fold(self.effect_models_, X, _predict_value)
+        if self.propensity_models_ is None:
+            self.propensity_ = np.full(X.shape[0], treated.mean())
+        else:
+            self.propensity_ = np.empty(X.shape[0], dtype=np.float64)
+            for model, test in zip(self.propensity_models_, self.test_folds_):
+                self.propensity_[test] = _predict_positive(model, X[test])
+        self.treated_share_ = float(treated.mean())
+        self.cate_ = self.propensity_ * tau0 + (1 - self.propensity_) * tau1
+        return self
+
+    def _cate(self, X):
+        tau1, tau0 = self._fold_average(self.effect_models_, X, _predict_value)
+        if self.propensity_models_ is None:
+            propensity = np.full(X.shape[0], self.treated_share_)
+        else:
+            propensity = np.mean(
+                [_predict_positive(m, X) for m in self.propensity_models_], axis=0
+            )
+        return propensity * tau0 + (1 - propensity) * tau1
@@ -0,0 +1,168 @@
+"""
+Size-aware scatter plots with a best-fit line, for notebook 1.
+
+Every plotting cell in notebook 1 draws all 100,000 simulated points with
+``plt.scatter`` and a 100,000-vertex ``plt.plot`` line from ``np.polyfit``.
+Almost all of the render time goes into building those Matplotlib artists.
+``scatter_with_fit`` picks a renderer based on the number of points: a plain
+scatter for small data, a reservoir sample of points, a hexbin, or a single
+rasterized 2-D histogram image. ``add_fit_line`` draws the least-squares line as
+a two-point segment computed from streaming sufficient statistics.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from causal_tutorial.stats import CorrelationAccumulator
+
+KINDS = ("auto", "scatter", "sample", "hexbin", "hist2d")
+
+
+def reservoir_sample(chunks, k, seed=0):
+    """
+    Uniform sample of `k` (x, y) pairs from a stream of chunks
+
+    Every pair gets a uniform random key, and the `k` smallest keys seen so far
+    are kept, so each chunk is handled with vectorized NumPy operations.
+
+    Args:
+        chunks: Iterable of (x, y) pairs of 1-D arrays
+        k: Int, sample size
+        seed: Int, numpy Generator or None
+
+    Returns: Tuple of arrays (x_sample, y_sample) with at most `k` entries
+    """
+    rng = np.random.default_rng(seed)
+    keys = np.empty(0)
+    kept_x = np.empty(0)
+    kept_y = np.empty(0)
+    for x, y in chunks:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keys = np.concatenate([keys, rng.random(len(x))])
+        kept_x = np.concatenate([kept_x, x])
+        kept_y = np.concatenate([kept_y, y])
+        if len(keys) > k:
+            keep = np.argpartition(keys, k - 1)[:k]
+            keys, kept_x, kept_y = keys[keep], kept_x[keep], kept_y[keep]
+    return kept_x, kept_y
+
+
+def _chunks(x, y, chunk_size):
+    for start in range(0, len(x), chunk_size):
+        yield x[start : start + chunk_size], y[start : start + chunk_size]
+
+
+def fit_line(x, y, chunk_size=1_000_000):
+    """
+    Least-squares slope and intercept from streaming sufficient statistics
+
+    Args:
+        x: 1-D array-like
+        y: 1-D array-like of the same length
+        chunk_size: Int, number of rows folded in at a time
+
+    Returns: Tuple of floats (slope, intercept)
+    """
+    acc = CorrelationAccumulator()
+    for x_chunk, y_chunk in _chunks(np.asarray(x), np.asarray(y), chunk_size):
+        acc.update(x_chunk, y_chunk)
+    return acc.line()
+
+
+def add_fit_line(x, y, ax=None, color="dimgray", label=None, **line_kwargs):
+    """
+    Draws the least-squares line of y on x as a single segment
+
+    Args:
+        x: 1-D array-like
+        y: 1-D array-like of the same length
+        ax: Optional matplotlib Axes, defaults to the current axes
+        color: Matplotlib color of the line
+        label: Optional legend label
+        **line_kwargs: Passed on to `ax.plot`
+
+    Returns: Tuple of floats (slope, intercept)
+    """
+    ax = ax if ax is not None else plt.gca()
+    x = np.asarray(x, dtype=np.float64)
+    slope, intercept = fit_line(x, y)
+    ends = np.array([x.min(), x.max()])
+    ax.plot(ends, slope * ends + intercept, color=color, label=label, **line_kwargs)
+    return slope, intercept
+
+
+def scatter_with_fit(
+    x,
+    y,
+    ax=None,
+    kind="auto",
+    max_points=5_000,
+    gridsize=80,
+    bins=300,
+    fit=True,
+    color=None,
+    line_color="dimgray",
+    label=None,
+    seed=0,
+):
+    """
+    Scatter-style plot of y against x that stays fast for large arrays
+
+    With kind="auto", up to `max_points` points are drawn as a plain scatter,
+    up to 1,000,000 are drawn as a `max_points` reservoir sample, and anything
+    larger is rasterized as a 2-D histogram.
+
+    Args:
+        x: 1-D array-like
+        y: 1-D array-like of the same length
+        ax: Optional matplotlib Axes, defaults to the current axes
+        kind: Str, one of "auto", "scatter", "sample", "hexbin" or "hist2d"
+        max_points: Int, number of points drawn by "scatter"/"sample"
+        gridsize: Int, number of hexagons across for "hexbin"
+        bins: Int, number of bins per axis for "hist2d"
+        fit: Bool, whether to add the least-squares line
+        color: Optional matplotlib color for points
+        line_color: Matplotlib color of the fitted line
+        label: Optional legend label for the fitted line
+        seed: Int, seed of the point sample
+
+    Returns: matplotlib Axes
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    ax = ax if ax is not None else plt.gca()
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    if kind == "auto":
+        if len(x) <= max_points:
+            kind = "scatter"
+        elif len(x) <= 1_000_000:
+            kind = "sample"
+        else:
+            kind = "hist2d"
+
+    if kind == "scatter":
+        ax.scatter(x, y, color=color)
+    elif kind == "sample":
+        x_sample, y_sample = reservoir_sample(
+            _chunks(x, y, 1_000_000), max_points, seed
+        )
+        ax.scatter(x_sample, y_sample, color=color, rasterized=True)
+    elif kind == "hexbin":
+        ax.hexbin(x, y, gridsize=gridsize, mincnt=1, cmap="Blues", rasterized=True)
+    else:
+        counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+        ax.imshow(
+            np.ma.masked_equal(counts.T, 0),
+            origin="lower",
+            extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+            aspect="auto",
+            cmap="Blues",
+            interpolation="nearest",
+        )
+
+    if fit:
+        add_fit_line(x, y, ax=ax, color=line_color, label=label)
+    return ax
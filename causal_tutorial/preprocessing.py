@@ -0,0 +1,223 @@
+"""
+Fitted, reusable version of notebook 2's churn preprocessing.
+
+The notebook scales five columns with ``StandardScaler``, one-hot encodes
+``region``, ``internation_plan`` and ``voicemail_plan`` with ``pd.get_dummies``,
+splits ``customer_service_calls`` at its median with ``pd.qcut`` and then drops a
+reference level from every dummy group. ``ChurnPreprocessor`` learns the scaling
+statistics, category levels and bin edges once, can be pickled, and turns any
+later batch into a C-contiguous float32 matrix with the same columns, even if a
+batch happens to be missing some of the category levels.
+
+Categorical columns listed in ``native_categorical`` are kept as a single column
+of level codes instead of dummies, for learners such as
+``HistGradientBoostingClassifier`` that split on categories natively.
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils.validation import check_is_fitted
+
+SCALED_COLUMNS = (
+    "age",
+    "acct_length",
+    "daytime_call_mins",
+    "evening_call_mins",
+    "nighttime_call_mins",
+)
+# Column -> (dummy prefix, reference level that gets dropped)
+CATEGORICAL_COLUMNS = {
+    "region": ("region", "East North Central"),
+    "internation_plan": ("int_plan", "no"),
+    "voicemail_plan": ("vm_plan", "no"),
+}
+# Column -> number of quantile bins
+BINNED_COLUMNS = {"customer_service_calls": 2}
+
+
+class ChurnPreprocessor(TransformerMixin, BaseEstimator):
+    """
+    Scales, one-hot encodes and bins the churn covariates in a single pass
+
+    The output columns are, in order: the scaled columns, the dummies for each
+    categorical column (minus its reference level, levels sorted), then the
+    bin index of each binned column. This matches the `df2` frame built in
+    notebook 2, without the `churn` outcome.
+
+    Args:
+        scaled: Iterable of str, columns to standardize
+        categorical: Dict mapping column to a (prefix, reference level) tuple
+        binned: Dict mapping column to its number of quantile bins
+        handle_unknown: Str, "error" to raise on category levels that weren't
+            seen during `fit`, or "ignore" to encode them like the reference level
+            (or as NaN, i.e. missing, for `native_categorical` columns)
+        native_categorical: Iterable of str, categorical columns to output as one
+            column of sorted-level codes, named after the column's prefix,
+            instead of dummies
+
+    Attributes:
+        categorical_features_: Boolean array, True for the output columns that
+            hold native category codes. Pass it as `categorical_features` to
+            HistGradientBoostingClassifier.
+    """
+
+    def __init__(
+        self,
+        scaled=SCALED_COLUMNS,
+        categorical=CATEGORICAL_COLUMNS,
+        binned=BINNED_COLUMNS,
+        handle_unknown="error",
+        native_categorical=(),
+    ):
+        self.scaled = scaled
+        self.categorical = categorical
+        self.binned = binned
+        self.handle_unknown = handle_unknown
+        self.native_categorical = native_categorical
+
+    def fit(self, df, y=None):
+        """
+        Learns scaling statistics, category levels and bin edges from `df`
+
+        Args:
+            df: DataFrame containing all of the configured columns
+            y: Ignored
+
+        Returns: self
+        """
+        if self.handle_unknown not in ("error", "ignore"):
+            raise ValueError("handle_unknown must be 'error' or 'ignore'")
+
+        scaled = list(self.scaled)
+        values = df[scaled].to_numpy(dtype=np.float64)
+        self.mean_ = values.mean(axis=0)
+        scale = values.std(axis=0)
+        # Same convention as StandardScaler: constant columns are left unscaled
+        scale[scale == 0] = 1.0
+        self.scale_ = scale
+
+        native = set(self.native_categorical)
+        if not native.issubset(self.categorical):
+            raise ValueError("native_categorical columns must also be in categorical")
+
+        self.levels_ = {}
+        names = list(scaled)
+        is_native = [False] * len(scaled)
+        for col, (prefix, reference) in self.categorical.items():
+            levels = sorted(pd.unique(df[col].dropna()).tolist())
+            if reference not in levels:
+                raise ValueError(f"Reference level '{reference}' not found in '{col}'")
+            self.levels_[col] = levels
+            if col in native:
+                names.append(prefix)
+                is_native.append(True)
+            else:
+                dummies = [
+                    f"{prefix}_{level}" for level in levels if level != reference
+                ]
+                names += dummies
+                is_native += [False] * len(dummies)
+
+        self.bin_edges_ = {}
+        for col, n_bins in self.binned.items():
+            _, edges = pd.qcut(df[col], n_bins, retbins=True)
+            self.bin_edges_[col] = edges
+            names.append(col)
+            is_native.append(False)
+
+        self.categorical_features_ = np.asarray(is_native, dtype=bool)
+        self.feature_names_out_ = np.asarray(names, dtype=object)
+        self.n_features_out_ = len(names)
+        return self
+
+    def get_feature_names_out(self, input_features=None):
+        """
+        Names of the output columns, in order
+
+        Returns: Array of str
+        """
+        check_is_fitted(self, "feature_names_out_")
+        return self.feature_names_out_.copy()
+
+    def transform(self, df):
+        """
+        Encodes a batch with the fitted statistics
+
+        Args:
+            df: DataFrame containing all of the configured columns
+
+        Returns: C-contiguous float32 array of shape (n_rows, n_features_out_)
+        """
+        check_is_fitted(self, "feature_names_out_")
+        n_rows = len(df)
+        out = np.zeros((n_rows, self.n_features_out_), dtype=np.float32)
+
+        n_scaled = len(self.mean_)
+        values = df[list(self.scaled)].to_numpy(dtype=np.float64)
+        out[:, :n_scaled] = (values - self.mean_) / self.scale_
+
+        col_idx = n_scaled
+        rows = np.arange(n_rows)
+        native = set(self.native_categorical)
+        for col, (_, reference) in self.categorical.items():
+            levels = self.levels_[col]
+            codes = pd.Index(levels).get_indexer(df[col])
+            unknown = (codes < 0) & df[col].notna().to_numpy()
+            if self.handle_unknown == "error" and unknown.any():
+                unseen = sorted(set(df[col][unknown].tolist()))
+                raise ValueError(f"Unseen levels in '{col}': {unseen}")
+
+            if col in native:
+                out[:, col_idx] = np.where(codes >= 0, codes, np.nan)
+                col_idx += 1
+                continue
+
+            # Shift codes past the dropped reference so they index the dummy block
+            ref_code = levels.index(reference)
+            dummy_codes = np.where(codes > ref_code, codes - 1, codes)
+            hit = (codes >= 0) & (codes != ref_code)
+            out[rows[hit], col_idx + dummy_codes[hit]] = 1.0
+            col_idx += len(levels) - 1
+
+        for col, edges in self.bin_edges_.items():
+            # qcut bins are right-closed, so a value equal to an inner edge falls
+            # in the lower bin. Values outside the fitted range are clipped.
+            inner = edges[1:-1]
+            values = df[col].to_numpy(dtype=np.float64)
+            out[:, col_idx] = np.searchsorted(inner, values, side="left")
+            col_idx += 1
+
+        return out
+
+    def transform_frame(self, df):
+        """
+        Same as `transform`, but returns a DataFrame with named columns
+
+        Args:
+            df: DataFrame containing all of the configured columns
+
+        Returns: DataFrame indexed like `df`
+        """
+        return pd.DataFrame(
+            self.transform(df), columns=self.get_feature_names_out(), index=df.index
+        )
+
+    def save(self, path):
+        """
+        Pickles the fitted preprocessor to `path`
+        """
+        with open(path, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a preprocessor written by `save`
+
+        Returns: ChurnPreprocessor
+        """
+        with open(path, "rb") as handle:
+            return pickle.load(handle)
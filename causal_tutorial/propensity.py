@@ -0,0 +1,321 @@
+"""
+Propensity models fitted once and shared by every propensity-based estimate.
+
+Notebook 3 estimates the effect with ``backdoor.propensity_score_matching`` and
+then ``backdoor.propensity_score_stratification``, and each DoWhy estimator
+fits its own logistic regression of the treatment on the same confounders.
+IPW does it again, and every refuter simulation refits the model too, although
+the fitted model only depends on the data, the confounders and the learner.
+
+``fit_propensity`` keys each fit by exactly that: a fingerprint of the
+treatment and confounder columns (a hash of their values, not of the whole
+frame), the confounder set, and the learner with its parameters. Fitted models
+are kept in a module-level LRU cache, so the second estimator asks for the same
+key and gets the model back without a fit.
+
+DoWhy's propensity estimators skip their own fit when the data already has a
+``propensity_score`` column, so ``with_propensity_scores`` is how the cached
+scores reach them. ``causal_tutorial.estimands.estimate_effect``, the refuters of
+``causal_tutorial.refutation`` and ``causal_tutorial.matching`` all go through
+it.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from causal_tutorial.learners import make_learner
+
+PROPENSITY_COLUMN = "propensity_score"
+DEFAULT_MAXSIZE = 32
+
+
+@dataclass(frozen=True)
+class PropensityModel:
+    """
+    A fitted propensity model and the scores of the rows it was fitted on
+
+    Attributes:
+        model: Fitted classifier exposing `predict_proba`
+        treatment: Str, name of the treatment column
+        confounders: Tuple of str, the confounder columns, in order
+        feature_names: Tuple of str, the encoded columns the model was fitted on
+        scores: Float array, P(treatment = 1 | confounders) for each row (treat
+            it as read-only, it is shared by every cache hit)
+    """
+
+    model: object
+    treatment: str
+    confounders: tuple
+    feature_names: tuple
+    scores: np.ndarray
+
+    def predict(self, data):
+        """
+        Propensity scores for new rows
+
+        Args:
+            data: DataFrame with the confounder columns
+
+        Returns: Float array
+        """
+        X = encode_confounders(data, self.confounders)
+        X = X.reindex(columns=list(self.feature_names), fill_value=0.0)
+        return self.model.predict_proba(X)[:, 1]
+
+
+class PropensityCache:
+    """
+    Thread-safe LRU cache of fitted propensity models
+
+    Args:
+        maxsize: Int, number of models kept before the least recently used one
+            is evicted
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        The model stored under `key`, marked as most recently used, or None
+        """
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._models.move_to_end(key)
+            return model
+
+    def put(self, key, model):
+        """
+        Stores `model`, evicting the least recently used model when full
+
+        Returns: The model stored under `key`, which is the earlier one when
+            another thread stored it first
+        """
+        with self._lock:
+            model = self._models.setdefault(key, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.maxsize:
+                self._models.popitem(last=False)
+            return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Returns: Dict with keys hits, misses, size and maxsize
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._models),
+                "maxsize": self.maxsize,
+            }
+
+
+_CACHE = PropensityCache()
+
+
+def propensity_cache_info():
+    """
+    Hits, misses and size of the cache shared by `fit_propensity`
+
+    Returns: Dict, see `PropensityCache.info`
+    """
+    return _CACHE.info()
+
+
+def clear_propensity_cache():
+    """
+    Empties the cache shared by `fit_propensity` and resets its counters
+    """
+    _CACHE.clear()
+
+
+def data_fingerprint(data, columns):
+    """
+    Hash of the values of some columns, ignoring the index
+
+    Args:
+        data: DataFrame
+        columns: Iterable of str
+
+    Returns: Str, hex digest
+    """
+    columns = list(columns)
+    digest = hashlib.sha256(repr((len(data), columns)).encode())
+    for column in columns:
+        values = data[column]
+        digest.update(str(values.dtype).encode())
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+    return digest.hexdigest()
+
+
+def encode_confounders(data, confounders):
+    """
+    Confounders with categorical columns one-hot encoded, first level dropped,
+    like DoWhy's propensity estimators do
+
+    Returns: DataFrame of floats
+    """
+    X = data[list(confounders)]
+    categorical = X.select_dtypes(include=["object", "string", "category"]).columns
+    if len(categorical):
+        X = pd.get_dummies(X, columns=list(categorical), drop_first=True)
+    return X.astype(np.float64)
+
+
+def _learner_key(learner, params):
+    if isinstance(learner, str):
+        return (learner, repr(sorted(params.items())))
+    if params:
+        raise ValueError("Learner parameters can only be given with a learner name")
+    return (type(learner).__name__, repr(sorted(learner.get_params().items())))
+
+
+def fit_propensity(
+    data, treatment, confounders, learner="logistic", cache=None, **params
+):
+    """
+    Propensity model of `treatment` on `confounders`, fitted once per key
+
+    Args:
+        data: DataFrame with the treatment and confounder columns
+        treatment: Str, name of the binary treatment column
+        confounders: Iterable of str, confounder columns
+        learner: Name in `causal_tutorial.learners.LEARNERS`, or an unfitted
+            scikit-learn classifier (a clone of it is fitted)
+        cache: Optional PropensityCache, defaults to the shared module cache.
+            Pass False to always fit.
+        **params: Passed on to `make_learner` with a learner name
+
+    Returns: PropensityModel
+    """
+    confounders = tuple(confounders)
+    if not confounders:
+        raise ValueError("Propensity models need at least one confounder")
+    if cache is None:
+        cache = _CACHE
+    key = None
+    if cache is not False:
+        key = (
+            data_fingerprint(data, (treatment, *sorted(confounders))),
+            treatment,
+            # The fit doesn't depend on the column order, so neither does the key
+            tuple(sorted(confounders)),
+            _learner_key(learner, params),
+        )
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    X = encode_confounders(data, confounders)
+    if isinstance(learner, str):
+        model = make_learner(learner, **params)
+    else:
+        model = clone(learner)
+    model.fit(X, np.ravel(data[treatment].to_numpy()).astype(int))
+    scores = model.predict_proba(X)[:, 1]
+    scores.setflags(write=False)
+    fitted = PropensityModel(
+        model=model,
+        treatment=treatment,
+        confounders=confounders,
+        feature_names=tuple(map(str, X.columns)),
+        scores=scores,
+    )
+    if key is None:
+        return fitted
+    return cache.put(key, fitted)
+
+
+def with_propensity_scores(
+    data,
+    treatment,
+    confounders,
+    learner="logistic",
+    column=PROPENSITY_COLUMN,
+    cache=None,
+    **params,
+):
+    """
+    A copy of `data` with the cached propensity scores in `column`
+
+    DoWhy's matching, stratification and weighting estimators use this column
+    instead of fitting their own model. A stale `column` already in `data` is
+    ignored and replaced.
+
+    Args:
+        data: DataFrame
+        treatment: Str, name of the binary treatment column
+        confounders: Iterable of str, confounder columns
+        learner: See `fit_propensity`
+        column: Str, name of the score column, DoWhy's default
+            "propensity_score" unless the estimator was told otherwise
+        cache: See `fit_propensity`
+        **params: See `fit_propensity`
+
+    Returns: DataFrame
+    """
+    fitted = fit_propensity(
+        data, treatment, confounders, learner=learner, cache=cache, **params
+    )
+    return data.assign(**{column: fitted.scores})
+
+
+def estimator_data(data, estimator, cache=None):
+    """
+    `data` with cached scores for a DoWhy propensity estimator to use
+
+    Does nothing for other estimators. An existing score column is replaced:
+    DoWhy writes its scores into the DataFrame it was given, so a column left
+    there by an earlier estimate may belong to another treatment or confounder
+    set. The estimator's own `propensity_score_model`, when set, is the learner.
+
+    Args:
+        data: DataFrame the estimator is about to be fitted on
+        estimator: Unfitted DoWhy CausalEstimator
+        cache: See `fit_propensity`
+
+    Returns: DataFrame
+    """
+    from dowhy.causal_estimators.propensity_score_estimator import (
+        PropensityScoreEstimator,
+    )
+
+    if not isinstance(estimator, PropensityScoreEstimator):
+        return data
+    column = estimator.propensity_score_column
+    estimand = estimator._target_estimand
+    confounders = estimand.get_adjustment_set()
+    if len(estimand.treatment_variable) != 1 or not confounders:
+        # Left to DoWhy, which raises its own errors for these
+        return data
+    return with_propensity_scores(
+        data,
+        estimand.treatment_variable[0],
+        confounders,
+        learner=estimator.propensity_score_model or "logistic",
+        column=column,
+        cache=cache,
+    )
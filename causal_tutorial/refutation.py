@@ -0,0 +1,297 @@
+"""
+DoWhy refuters run together, with their simulations spread over a process pool.
+
+Notebook 3 calls ``refute_estimate`` three times in a row (random common cause,
+permuted placebo treatment, data subset), and each refuter re-estimates the
+effect once per simulation in a plain loop. Those simulations are independent,
+so ``refutation_suite`` flattens the simulations of every refuter into one list
+of tasks and runs them on a process pool:
+
+* each simulation does exactly what DoWhy's own refuter does for one iteration
+  (add a ``w_random`` confounder, swap in a ``placebo`` treatment, or resample
+  the rows), then refits a new estimator of the same kind as the estimate;
+* every simulation draws from its own child of a ``numpy.random.SeedSequence``,
+  so the results don't depend on the number of workers or on which refuters are
+  run together;
+* the data and the estimate are sent to each worker once, tasks only carry
+  their seeds;
+* propensity score estimators take their scores from the cache of
+  ``causal_tutorial.propensity``, so a simulation that repeats an earlier fit
+  (same data, confounders and learner) doesn't refit the propensity model;
+* p-values come from DoWhy's ``test_significance``, like ``refute_estimate``.
+
+For a plain ``backdoor.linear_regression`` estimate, the placebo and random
+common cause simulations skip the refits entirely and go through the closed-form
+path of ``causal_tutorial.linear_refuters``, drawing the same random columns from
+the same seeds.
+
+The result is one DataFrame with a row per refuter.
+"""
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from causal_tutorial.propensity import estimator_data
+
+DEFAULT_NUM_SIMULATIONS = 100
+DEFAULT_REFUTERS = (
+    ("random_common_cause", {}),
+    ("placebo_treatment_refuter", {"placebo_type": "permute"}),
+    ("data_subset_refuter", {"subset_fraction": 0.8}),
+)
+REFUTATION_TYPES = {
+    "random_common_cause": "Refute: Add a random common cause",
+    "placebo_treatment_refuter": "Refute: Use a Placebo Treatment",
+    "data_subset_refuter": "Refute: Use a subset of data",
+}
+
+CLOSED_FORM_REFUTERS = ("random_common_cause", "placebo_treatment_refuter")
+# Random columns generated at once by the closed-form path, bounding its memory
+_BLOCK_ELEMENTS = 1 << 24
+
+# Populated in each worker process by `_init_worker`
+_WORKER_STATE = {}
+
+
+def _prepare_estimand(name, estimand):
+    """
+    The estimand a refuter's simulations refit against
+    """
+    estimand = copy.deepcopy(estimand)
+    if name == "random_common_cause":
+        estimand.set_adjustment_set(estimand.get_adjustment_set() + ["w_random"])
+    elif name == "placebo_treatment_refuter":
+        estimand.treatment_variable = ["placebo"]
+    elif name != "data_subset_refuter":
+        raise ValueError(
+            f"Unsupported refuter '{name}', expected one of {list(REFUTATION_TYPES)}"
+        )
+    return estimand
+
+
+def _placebo(data, treatment, placebo_type, rng):
+    values = data[treatment]
+    if placebo_type == "permute":
+        return values.to_numpy()[rng.permutation(len(data))]
+    # Same distributions as DoWhy's default placebo
+    if pd.api.types.is_bool_dtype(values):
+        return rng.binomial(1, 0.5, len(data)).astype(bool)
+    if pd.api.types.is_integer_dtype(values):
+        return rng.integers(values.min(), values.max() + 1, len(data))
+    if pd.api.types.is_float_dtype(values):
+        return rng.standard_normal(len(data))
+    return rng.choice(values.unique(), size=len(data))
+
+
+def _random_column(name, kwargs, data, estimate, rng):
+    """
+    The `w_random` or `placebo` column of one simulation
+    """
+    if name == "random_common_cause":
+        return rng.standard_normal(len(data))
+    treatment = estimate._treatment_name[0]
+    return _placebo(data, treatment, kwargs.get("placebo_type", "default"), rng)
+
+
+def _simulate(name, kwargs, estimand, seed_seq):
+    """
+    One simulation of refuter `name`, returning the re-estimated effect
+    """
+    data = _WORKER_STATE["data"]
+    estimate = _WORKER_STATE["estimate"]
+    rng = np.random.default_rng(seed_seq)
+    if name == "random_common_cause":
+        new_data = data.assign(
+            w_random=_random_column(name, kwargs, data, estimate, rng)
+        )
+    elif name == "placebo_treatment_refuter":
+        new_data = data.assign(
+            placebo=_random_column(name, kwargs, data, estimate, rng)
+        )
+    else:
+        new_data = data.sample(
+            frac=kwargs.get("subset_fraction", 0.8), random_state=rng
+        )
+
+    estimator = estimate.estimator.get_new_estimator_object(estimand)
+    new_data = estimator_data(new_data, estimator)
+    estimator.fit(
+        new_data,
+        effect_modifier_names=estimate.estimator._effect_modifier_names,
+        **getattr(estimator, "_fit_params", None) or {},
+    )
+    new_effect = estimator.estimate_effect(
+        new_data,
+        control_value=estimate.control_value,
+        treatment_value=estimate.treatment_value,
+        target_units=estimate.estimator._target_units,
+    )
+    return new_effect.value
+
+
+def _closed_form(name, kwargs, data, estimate, seeds, ols, scale):
+    """
+    All simulations of a placebo or random common cause refuter, without refits
+    """
+    effects = (
+        ols.added_confounder_effects
+        if name == "random_common_cause"
+        else ols.placebo_effects
+    )
+    block = max(1, _BLOCK_ELEMENTS // max(len(data), 1))
+    out = [np.empty(0)]
+    for start in range(0, len(seeds), block):
+        columns = np.column_stack(
+            [
+                _random_column(name, kwargs, data, estimate, np.random.default_rng(s))
+                for s in seeds[start : start + block]
+            ]
+        )
+        out.append(effects(columns) * scale)
+    return np.concatenate(out)
+
+
+def _init_worker(data, estimate, refuters):
+    _WORKER_STATE.update(data=data, estimate=estimate, refuters=refuters)
+
+
+def _run_chunk(task):
+    refuter_idx, seeds = task
+    name, kwargs, estimand = _WORKER_STATE["refuters"][refuter_idx]
+    return refuter_idx, [float(_simulate(name, kwargs, estimand, s)) for s in seeds]
+
+
+def refutation_suite(
+    data,
+    estimand,
+    estimate,
+    refuters=DEFAULT_REFUTERS,
+    num_simulations=DEFAULT_NUM_SIMULATIONS,
+    seed=0,
+    significance_level=0.05,
+    max_workers=None,
+    closed_form=True,
+):
+    """
+    Runs several DoWhy refuters at once, their simulations on a process pool
+
+    Args:
+        data: DataFrame the estimate was computed on
+        estimand: IdentifiedEstimand the estimate was computed from
+        estimate: CausalEstimate from `CausalModel.estimate_effect` or
+            `causal_tutorial.estimands.estimate_effect`
+        refuters: Iterable of refuter names or (name, kwargs) tuples. Supported
+            names are "random_common_cause", "placebo_treatment_refuter" (kwarg
+            placebo_type, "permute" or "default") and "data_subset_refuter"
+            (kwarg subset_fraction). A "num_simulations" kwarg overrides the
+            shared `num_simulations` for that refuter.
+        num_simulations: Int, simulations per refuter
+        seed: Int or numpy.random.SeedSequence all simulation seeds are spawned
+            from. Refuter i always uses the i-th child, so the same seed gives
+            the same simulations for any `max_workers`.
+        significance_level: Float, passed on to DoWhy's `test_significance`
+        max_workers: Optional int, size of the process pool (defaults to the
+            number of CPUs). Use 1 to run every simulation in this process.
+        closed_form: Bool, use `causal_tutorial.linear_refuters` for the placebo
+            and random common cause refuters when the estimate is a plain linear
+            regression. Set to False to always refit.
+
+    Returns: DataFrame with one row per refuter and columns refuter,
+        refutation_type, num_simulations, estimated_effect, new_effect (mean over
+        the simulations), new_effect_std, p_value and is_statistically_significant
+    """
+    from dowhy.causal_refuter import test_significance
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    configs = []
+    for refuter in refuters:
+        name, kwargs = (refuter, {}) if isinstance(refuter, str) else refuter
+        kwargs = dict(kwargs)
+        n_sims = kwargs.pop("num_simulations", num_simulations)
+        configs.append((name, kwargs, _prepare_estimand(name, estimand), n_sims))
+    refuter_seeds = [
+        child.spawn(n_sims)
+        for child, (*_, n_sims) in zip(seed.spawn(len(configs)), configs)
+    ]
+    state = [(name, kwargs, target) for name, kwargs, target, _ in configs]
+
+    simulations = [[] for _ in configs]
+    refit = list(range(len(configs)))
+    if closed_form:
+        from causal_tutorial.linear_refuters import from_estimate, supports_closed_form
+
+        if supports_closed_form(estimate):
+            ols, scale = from_estimate(data, estimate)
+            refit = []
+            for i, (name, kwargs, _, _) in enumerate(configs):
+                if name in CLOSED_FORM_REFUTERS:
+                    simulations[i].extend(
+                        _closed_form(
+                            name, kwargs, data, estimate, refuter_seeds[i], ols, scale
+                        )
+                    )
+                else:
+                    refit.append(i)
+
+    if max_workers == 1:
+        n_workers = 1
+    else:
+        n_workers = max_workers or os.cpu_count() or 1
+    total = sum(configs[i][3] for i in refit)
+    chunk = max(1, total // (4 * n_workers))
+    tasks = [
+        (i, refuter_seeds[i][start : start + chunk])
+        for i in refit
+        for start in range(0, len(refuter_seeds[i]), chunk)
+    ]
+
+    if not tasks:
+        results = []
+    elif n_workers == 1:
+        _WORKER_STATE.update(data=data, estimate=estimate, refuters=state)
+        try:
+            results = [_run_chunk(task) for task in tasks]
+        finally:
+            _WORKER_STATE.clear()
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(data, estimate, state),
+        ) as pool:
+            # map keeps the task order, so each refuter's values stay in seed order
+            results = list(pool.map(_run_chunk, tasks))
+    for i, values in results:
+        simulations[i].extend(values)
+
+    rows = []
+    for (name, _, _, n_sims), values in zip(configs, simulations):
+        values = np.asarray(values, dtype=np.float64)
+        reference = estimate
+        if name == "placebo_treatment_refuter":
+            # The placebo effect should be indistinguishable from zero
+            reference = copy.copy(estimate)
+            reference.value = 0
+        significance = test_significance(
+            reference, values, significance_level=significance_level
+        )
+        rows.append(
+            {
+                "refuter": name,
+                "refutation_type": REFUTATION_TYPES[name],
+                "num_simulations": n_sims,
+                "estimated_effect": float(estimate.value),
+                "new_effect": float(values.mean()) if n_sims else np.nan,
+                "new_effect_std": float(values.std(ddof=1)) if n_sims > 1 else np.nan,
+                "p_value": float(significance["p_value"]),
+                "is_statistically_significant": bool(
+                    significance["is_statistically_significant"]
+                ),
+            }
+        )
+    return pd.DataFrame(rows)
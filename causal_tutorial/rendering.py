@@ -0,0 +1,310 @@
+"""
+Cached SVG rendering of the tutorial's causal graphs.
+
+Displaying a ``graphviz.Digraph`` in a notebook spawns the ``dot`` binary to lay
+it out, every time the cell re-runs, even though the graphs almost never change.
+``render_svg`` keys each graph by a hash of its canonical form (the sorted
+statements plus graph, node and edge attributes and the layout engine), keeps
+the SVG in memory and on disk, and only calls ``dot`` on a miss. ``prefetch``
+starts that work on a background thread.
+
+``Digraph`` is a drop-in ``graphviz.Digraph`` whose notebook display goes through
+the cache. ``CausalGraphicalModel.draw`` returns one and prefetches it. In marimo,
+a graph whose layout hasn't finished displays as a ``mo.lazy`` placeholder that
+awaits the background thread, so the cell returns at once and the drawing
+appears when it is ready; other front ends wait for the layout.
+
+Whether ``dot`` can run is probed once per process (``has_dot``). Without it,
+graphs are drawn by the pure-Python layered layout in ``causal_tutorial.layout``
+instead, so the notebooks never need to install Graphviz at startup.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import graphviz
+
+_MEMORY_CACHE = {}
+_IN_FLIGHT = {}
+_LOCK = threading.Lock()
+_EXECUTOR = None
+
+# A DOT identifier as written by the graphviz package: bare or double-quoted
+_ID = r'"(?:[^"\\]|\\.)*"|[^\s\[\]";=]+'
+_EDGE = re.compile(rf"^\s*({_ID})\s*->\s*({_ID})\s*(?:\[(.*)\])?\s*;?\s*$")
+_NODE = re.compile(rf"^\s*({_ID})\s*(?:\[(.*)\])?\s*;?\s*$")
+_ATTR = re.compile(rf"(\w+)\s*=\s*({_ID})")
+_KEYWORDS = {"graph", "node", "edge", "subgraph", "{", "}"}
+
+
+@functools.cache
+def has_dot():
+    """
+    Whether the Graphviz `dot` executable is installed and runs
+
+    Checked once per process.
+
+    Returns: Bool
+    """
+    executable = shutil.which("dot")
+    if executable is None:
+        return False
+    try:
+        subprocess.run([executable, "-V"], capture_output=True, timeout=10, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+def svg_cache_dir():
+    """
+    Directory used for rendered SVGs
+
+    Same root as `causal_tutorial.datasets.default_cache_dir` (the
+    CAUSAL_TUTORIAL_CACHE directory, or ~/.cache/causal_tutorial), without
+    importing pandas.
+
+    Returns: Path
+    """
+    env_dir = os.environ.get("CAUSAL_TUTORIAL_CACHE")
+    root = Path(env_dir) if env_dir else Path.home() / ".cache" / "causal_tutorial"
+    return root / "svg"
+
+
+def graph_key(dot):
+    """
+    Hash of a graph's canonical form
+
+    Statement order doesn't change the key, so the same nodes, edges and styling
+    built in a different order share one cached rendering.
+
+    Args:
+        dot: graphviz.Digraph or graphviz.Graph
+
+    Returns: Str, hex digest
+    """
+    canonical = {
+        "directed": dot.directed,
+        "strict": dot.strict,
+        "engine": dot.engine,
+        "graph_attr": sorted(dot.graph_attr.items()),
+        "node_attr": sorted(dot.node_attr.items()),
+        "edge_attr": sorted(dot.edge_attr.items()),
+        "body": sorted(line.strip() for line in dot.body),
+    }
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()
+
+
+def _executor():
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="causal_tutorial_render"
+            )
+        return _EXECUTOR
+
+
+def _unquote(identifier):
+    if identifier.startswith('"') and identifier.endswith('"'):
+        return re.sub(r"\\(.)", r"\1", identifier[1:-1])
+    return identifier
+
+
+def parse_digraph(dot):
+    """
+    Nodes, edges and node attributes of a graphviz.Digraph built with `.node` and
+    `.edge`
+
+    Args:
+        dot: graphviz.Digraph
+
+    Returns: Tuple (nodes, edges, attributes): a list of node names in order of
+        appearance, a list of (parent, child) tuples and a dict mapping node name
+        to its dict of attributes
+    """
+    nodes = {}
+    edges = []
+    for line in dot.body:
+        match = _EDGE.match(line)
+        if match:
+            a, b = _unquote(match.group(1)), _unquote(match.group(2))
+            nodes.setdefault(a, {})
+            nodes.setdefault(b, {})
+            edges.append((a, b))
+            continue
+        match = _NODE.match(line)
+        if match and match.group(1) not in _KEYWORDS:
+            attrs = {
+                key: _unquote(value)
+                for key, value in _ATTR.findall(match.group(2) or "")
+            }
+            nodes.setdefault(_unquote(match.group(1)), {}).update(attrs)
+    return list(nodes), edges, nodes
+
+
+def layered_fallback_svg(dot):
+    """
+    SVG of a graphviz.Digraph drawn without Graphviz, see `causal_tutorial.layout`
+
+    Args:
+        dot: graphviz.Digraph
+
+    Returns: Str
+    """
+    from causal_tutorial.layout import layered_svg
+
+    nodes, edges, attributes = parse_digraph(dot)
+    labels = {n: attrs["label"] for n, attrs in attributes.items() if "label" in attrs}
+    peripheries = {
+        n: int(attrs["peripheries"])
+        for n, attrs in attributes.items()
+        if attrs.get("peripheries", "").isdigit()
+    }
+    return layered_svg(nodes, edges, labels, peripheries, title=dot.name)
+
+
+def _cache_path(key, cache_dir):
+    return None if cache_dir is None else Path(cache_dir) / f"{key}.svg"
+
+
+def _cached(key, cache_dir):
+    with _LOCK:
+        svg = _MEMORY_CACHE.get(key)
+    path = _cache_path(key, cache_dir)
+    if svg is None and path is not None and path.exists():
+        svg = path.read_text(encoding="utf-8")
+        with _LOCK:
+            _MEMORY_CACHE[key] = svg
+    return svg
+
+
+def _render(dot, key, cache_dir):
+    if key.endswith("-dot"):
+        svg = dot.pipe(format="svg", encoding="utf-8")
+    else:
+        svg = layered_fallback_svg(dot)
+    path = _cache_path(key, cache_dir)
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so a concurrent reader never sees a partial file
+            partial = path.with_suffix(".svg.part")
+            partial.write_text(svg, encoding="utf-8")
+            partial.replace(path)
+        except OSError:
+            # A read-only cache location shouldn't stop the graph from showing
+            pass
+    with _LOCK:
+        _MEMORY_CACHE[key] = svg
+    return svg
+
+
+def prefetch(dot, cache_dir=None, use_cache=True):
+    """
+    Starts rendering a graph to SVG on a background thread
+
+    Graphs already in the memory or disk cache come back as a finished future
+    without starting a thread. The layout comes from `dot` when it is installed
+    and from `causal_tutorial.layout` otherwise.
+
+    Args:
+        dot: graphviz.Digraph or graphviz.Graph
+        cache_dir: Optional Path or str for the on-disk cache, defaults to
+            `svg_cache_dir()`
+        use_cache: Bool, set to False to skip the on-disk cache
+
+    Returns: concurrent.futures.Future resolving to the SVG text
+    """
+    # dot and fallback drawings of the same graph are cached separately; the
+    # fallback suffix is versioned with its output format
+    key = f"{graph_key(dot)}-{'dot' if has_dot() else 'layered2'}"
+    cache_dir = (cache_dir or svg_cache_dir()) if use_cache else None
+    svg = _cached(key, cache_dir)
+    if svg is not None:
+        future = Future()
+        future.set_result(svg)
+        return future
+    with _LOCK:
+        future = _IN_FLIGHT.get(key)
+        if future is not None:
+            return future
+    # Render a frozen copy, so later edits to `dot` can't race with the thread
+    future = _executor().submit(_render, dot.copy(), key, cache_dir)
+    with _LOCK:
+        future = _IN_FLIGHT.setdefault(key, future)
+    future.add_done_callback(lambda _: _forget(key))
+    return future
+
+
+def _forget(key):
+    with _LOCK:
+        _IN_FLIGHT.pop(key, None)
+
+
+def render_svg(dot, cache_dir=None, use_cache=True):
+    """
+    SVG text of a graph, from the cache when possible
+
+    Args:
+        dot: graphviz.Digraph or graphviz.Graph
+        cache_dir: Optional Path or str for the on-disk cache, defaults to
+            `svg_cache_dir()`
+        use_cache: Bool, set to False to skip the on-disk cache
+
+    Returns: Str
+    """
+    return prefetch(dot, cache_dir, use_cache).result()
+
+
+class Digraph(graphviz.Digraph):
+    """
+    graphviz.Digraph whose notebook display is served from the SVG cache
+
+    Everything else, including `.source`, `.render()` and `.pipe()`, behaves
+    exactly like graphviz.Digraph.
+    """
+
+    def prefetch(self):
+        """
+        Starts laying the graph out in the background
+
+        Returns: self, so it can end a cell
+        """
+        prefetch(self)
+        return self
+
+    def _display_(self):
+        """
+        marimo display: the SVG, or a placeholder while the layout still runs
+
+        The placeholder is a `mo.lazy` element that awaits the background
+        layout without blocking the kernel, so the cell building the graph
+        finishes at once and the drawing fills in when it is ready.
+        """
+        import marimo as mo
+
+        future = prefetch(self)
+        if future.done():
+            return mo.Html(future.result())
+
+        async def load():
+            return mo.Html(await asyncio.wrap_future(future))
+
+        return mo.lazy(load, show_loading_indicator=True)
+
+    # Other front ends (Jupyter, IPython) have no placeholder, so they wait
+    def _repr_image_svg_xml(self):
+        return render_svg(self)
+
+    def _repr_svg_(self):
+        return render_svg(self)
@@ -0,0 +1,204 @@
+"""
+In-repo structural causal models with the ``causalgraphicalmodels.csm`` API.
+
+``causalgraphicalmodels`` no longer imports on Python 3.10+ without
+monkey-patching ``collections``, its ``linear_model`` uses the removed
+``np.float`` alias, and importing it pulls in networkx and graphviz. This module
+keeps the same ``StructuralCausalModel``, ``linear_model`` and
+``logistic_model`` interface, plus ``.cgm`` and ``.cgm.draw()``, on top of
+``causal_tutorial.dag``. NumPy is only loaded when a model is sampled and
+pandas only when a DataFrame is built, so importing this module is close to free.
+
+The linear and logistic assignments keep their parents, weights, offset and
+noise scale as attributes, so ``causal_tutorial.compiled_scm`` can compile them.
+"""
+
+import inspect
+
+from causal_tutorial.dag import CausalGraphicalModel
+
+
+class CausalAssignmentModel:
+    """
+    A node's assignment function, together with the names of its parents
+
+    Args:
+        model: Callable taking the parent values and `n_samples` as keywords
+        parents: List of str
+    """
+
+    def __init__(self, model, parents):
+        self.model = model
+        self.parents = list(parents)
+
+    def __call__(self, **kwargs):
+        return self.model(**kwargs)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({','.join(self.parents)})"
+
+
+class LinearAssignmentModel(CausalAssignmentModel):
+    """
+    y = sum_i w_i * x_i + offset + Normal(0, noise_scale)
+    """
+
+    kind = "linear"
+
+    def __init__(self, parents, weights, offset=0, noise_scale=1):
+        if len(parents) != len(weights):
+            raise ValueError("parents and weights must have the same length")
+        if not parents:
+            raise ValueError("A linear model needs at least one parent")
+        super().__init__(self._evaluate, parents)
+        self.weights = list(weights)
+        self.offset = offset
+        self.noise_scale = noise_scale
+
+    def _evaluate(self, n_samples, **kwargs):
+        import numpy as np
+
+        total = sum(
+            np.asarray(kwargs[p], dtype=np.float64) * w
+            for p, w in zip(self.parents, self.weights)
+        )
+        return total + np.random.normal(
+            loc=self.offset, scale=self.noise_scale, size=n_samples
+        )
+
+
+class LogisticAssignmentModel(CausalAssignmentModel):
+    """
+    y ~ Bernoulli(sigmoid(sum_i w_i * x_i + offset))
+    """
+
+    kind = "logistic"
+    noise_scale = 0.0
+
+    def __init__(self, parents, weights, offset=0):
+        if len(parents) != len(weights):
+            raise ValueError("parents and weights must have the same length")
+        if not parents:
+            raise ValueError("A logistic model needs at least one parent")
+        super().__init__(self._evaluate, parents)
+        self.weights = list(weights)
+        self.offset = offset
+
+    def _evaluate(self, n_samples, **kwargs):
+        import numpy as np
+
+        logits = (
+            sum(
+                np.asarray(kwargs[p], dtype=np.float64) * w
+                for p, w in zip(self.parents, self.weights)
+            )
+            + self.offset
+        )
+        return np.random.binomial(n=1, p=1 / (1 + np.exp(-logits)))
+
+
+def linear_model(parents, weights, offset=0, noise_scale=1):
+    """
+    Creates an assignment of the form sum_i x_i * w_i + offset + noise
+
+    Args:
+        parents: List of str, variable names of the parents
+        weights: List of float, weight of each parent in the sum
+        offset: Float, offset for the sum
+        noise_scale: Float, standard deviation of the normal noise
+
+    Returns: LinearAssignmentModel
+    """
+    return LinearAssignmentModel(parents, weights, offset, noise_scale)
+
+
+def logistic_model(parents, weights, offset=0):
+    """
+    Creates a binary assignment y ~ Bernoulli(sigmoid(sum_i x_i * w_i + offset))
+
+    Args:
+        parents: List of str, variable names of the parents
+        weights: List of float, weight of each parent in the sum
+        offset: Float, offset for the sum
+
+    Returns: LogisticAssignmentModel
+    """
+    return LogisticAssignmentModel(parents, weights, offset)
+
+
+class StructuralCausalModel:
+    """
+    A set of structural assignments of the form {variable: function(parents)}
+
+    Each value is either an assignment built with `linear_model` or
+    `logistic_model`, a plain callable whose keyword arguments name its parents
+    (plus `n_samples`), or None for a variable that is set by intervention.
+
+    Args:
+        assignment: Dict mapping variable name to its assignment
+    """
+
+    def __init__(self, assignment):
+        self.assignment = dict(assignment)
+        set_nodes = []
+        edges = []
+
+        for node, model in assignment.items():
+            if model is None:
+                set_nodes.append(node)
+            elif isinstance(model, CausalAssignmentModel):
+                edges.extend((parent, node) for parent in model.parents)
+            elif callable(model):
+                parents = [
+                    p for p in inspect.signature(model).parameters if p != "n_samples"
+                ]
+                self.assignment[node] = CausalAssignmentModel(model, parents)
+                edges.extend((parent, node) for parent in parents)
+            else:
+                raise ValueError(
+                    "Model must be either callable or None. "
+                    f"Instead got {model} for node {node}."
+                )
+
+        self.cgm = CausalGraphicalModel(
+            nodes=list(assignment), edges=edges, set_nodes=set_nodes
+        )
+
+    def __repr__(self):
+        variables = ", ".join(map(str, sorted(self.cgm.nodes)))
+        return f"{self.__class__.__name__}({variables})"
+
+    def sample(self, n_samples=100, set_values=None):
+        """
+        Samples from the model
+
+        Args:
+            n_samples: Int, the number of samples to return
+            set_values: Optional dict mapping intervened-on variables to arrays
+                of length `n_samples`
+
+        Returns: DataFrame with one column per variable, in topological order
+        """
+        import numpy as np
+        import pandas as pd
+
+        set_values = set_values or {}
+        samples = {}
+        for node in self.cgm.topological_order():
+            model = self.assignment[node]
+            if model is None:
+                if len(set_values[node]) != n_samples:
+                    raise ValueError(f"set_values['{node}'] must have n_samples values")
+                samples[node] = np.asarray(set_values[node])
+            else:
+                parent_samples = {parent: samples[parent] for parent in model.parents}
+                samples[node] = model(n_samples=n_samples, **parent_samples)
+        return pd.DataFrame(samples)
+
+    def do(self, node):
+        """
+        Returns the StructuralCausalModel after an intervention on `node`
+        """
+        assignment = dict(self.assignment)
+        assignment[node] = None
+        return StructuralCausalModel(assignment)
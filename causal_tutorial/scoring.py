@@ -0,0 +1,245 @@
+"""
+Batched individual treatment effect scoring with the notebook 2 churn model.
+
+Once the notebook's outcome model is fitted, the effect of the international plan
+on one customer is P(churn | int_plan=1) - P(churn | int_plan=0). A nightly job
+scoring millions of customers shouldn't unpickle the model and the preprocessing
+for every request, so ``CATEScorer`` bundles both, is loaded once, and then
+scores one batch after another:
+
+* batches come in as Arrow record batches or tables, DataFrames, NumPy
+  structured arrays or dicts of raw columns (all encoded by the fitted
+  ``ChurnPreprocessor``), or as already-encoded 2-D NumPy matrices;
+* both counterfactual arms of a batch are scored with a single stacked
+  ``predict_proba`` call (see ``causal_tutorial.slearner``);
+* ``score_stream`` yields results batch by batch, and ``write_stream`` writes
+  them to an Arrow IPC stream as they are produced, so memory stays flat;
+* the wall time of every batch is recorded, and ``latency.summary()`` reports
+  the p50/p99 latencies and the throughput.
+"""
+
+import os
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from causal_tutorial.slearner import predict_counterfactuals
+
+RESULT_COLUMNS = ("mu1", "mu0", "cate")
+
+
+class LatencyRecorder:
+    """
+    Wall time and size of the most recent scored batches
+
+    Args:
+        window: Int, number of most recent batches the percentiles are taken over
+    """
+
+    def __init__(self, window=100_000):
+        self.seconds = deque(maxlen=window)
+        self.rows = deque(maxlen=window)
+
+    def record(self, seconds, n_rows):
+        self.seconds.append(seconds)
+        self.rows.append(n_rows)
+
+    def reset(self):
+        self.seconds.clear()
+        self.rows.clear()
+
+    def summary(self):
+        """
+        Latency percentiles and throughput over the recorded batches
+
+        Returns: Dict with keys batches, rows, p50_ms, p99_ms, max_ms and
+            rows_per_second (NaN for the timings when nothing was recorded)
+        """
+        seconds = np.fromiter(self.seconds, dtype=np.float64)
+        n_rows = int(sum(self.rows))
+        if not seconds.size:
+            nan = float("nan")
+            return {
+                "batches": 0,
+                "rows": 0,
+                "p50_ms": nan,
+                "p99_ms": nan,
+                "max_ms": nan,
+                "rows_per_second": nan,
+            }
+        p50, p99 = np.percentile(seconds, [50, 99]) * 1000
+        total = seconds.sum()
+        return {
+            "batches": int(seconds.size),
+            "rows": n_rows,
+            "p50_ms": float(p50),
+            "p99_ms": float(p99),
+            "max_ms": float(seconds.max() * 1000),
+            "rows_per_second": float(n_rows / total) if total > 0 else float("inf"),
+        }
+
+
+def _is_arrow(batch):
+    return hasattr(batch, "schema") and hasattr(batch, "to_pandas")
+
+
+class CATEScorer:
+    """
+    A fitted outcome model plus its preprocessing, scoring both treatment arms
+
+    Args:
+        model: Fitted classifier exposing `predict_proba`, with the treatment as
+            one of its features (e.g. notebook 2's `model`)
+        preprocessor: Fitted ChurnPreprocessor
+        features: List of str, the model's feature columns, in order. Each must
+            be one of the preprocessor's output columns.
+        treatment: Str, name of the binary treatment column (must be in
+            `features`)
+        chunk_size: Optional int, see `causal_tutorial.slearner.predict_counterfactuals`
+    """
+
+    def __init__(self, model, preprocessor, features, treatment, chunk_size=None):
+        features = list(features)
+        if treatment not in features:
+            raise ValueError(
+                f"Treatment column '{treatment}' must be one of the features"
+            )
+        names = list(preprocessor.get_feature_names_out())
+        missing = [f for f in features if f not in names]
+        if missing:
+            raise ValueError(f"Features {missing} are not preprocessor outputs")
+        self.model = model
+        self.preprocessor = preprocessor
+        self.features = features
+        self.treatment = treatment
+        self.treatment_idx = features.index(treatment)
+        self.chunk_size = chunk_size
+        self.columns = np.asarray([names.index(f) for f in features])
+        self.latency = LatencyRecorder()
+
+    def save(self, path):
+        """
+        Pickles the model and preprocessing together to `path`
+        """
+        with open(path, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a scorer written by `save`, with fresh latency statistics
+
+        Returns: CATEScorer
+        """
+        with open(path, "rb") as handle:
+            scorer = pickle.load(handle)
+        scorer.latency = LatencyRecorder()
+        return scorer
+
+    def _encode(self, batch):
+        if _is_arrow(batch):
+            batch = batch.to_pandas()
+        elif isinstance(batch, dict):
+            batch = pd.DataFrame(batch)
+        elif isinstance(batch, np.ndarray):
+            if batch.dtype.names is not None:
+                batch = pd.DataFrame(batch)
+            else:
+                # Already encoded, in the preprocessor's output column order
+                if (
+                    batch.ndim != 2
+                    or batch.shape[1] != self.preprocessor.n_features_out_
+                ):
+                    raise ValueError(
+                        "Encoded batches must have shape "
+                        f"(n_rows, {self.preprocessor.n_features_out_})"
+                    )
+                return batch[:, self.columns].astype(np.float64)
+        return self.preprocessor.transform(batch)[:, self.columns].astype(np.float64)
+
+    def score_arrays(self, batch):
+        """
+        Counterfactual predictions and effects for one batch, as arrays
+
+        Args:
+            batch: Arrow RecordBatch or Table, DataFrame, dict of columns, NumPy
+                structured array (raw columns), or 2-D NumPy array already
+                encoded by the preprocessor
+
+        Returns: Tuple of arrays (mu1, mu0, cate)
+        """
+        start = time.perf_counter()
+        X = self._encode(batch)
+        mu1, mu0 = predict_counterfactuals(
+            self.model, X, self.treatment_idx, chunk_size=self.chunk_size
+        )
+        cate = mu1 - mu0
+        self.latency.record(time.perf_counter() - start, X.shape[0])
+        return mu1, mu0, cate
+
+    def score(self, batch):
+        """
+        Counterfactual predictions and effects for one batch
+
+        Args:
+            batch: See `score_arrays`
+
+        Returns: Arrow RecordBatch for Arrow input, otherwise a DataFrame (indexed
+            like `batch` when it is one), with columns mu1, mu0 and cate
+        """
+        arrays = self.score_arrays(batch)
+        if _is_arrow(batch):
+            import pyarrow as pa
+
+            return pa.RecordBatch.from_arrays(
+                [pa.array(a) for a in arrays], names=list(RESULT_COLUMNS)
+            )
+        index = batch.index if isinstance(batch, pd.DataFrame) else None
+        return pd.DataFrame(dict(zip(RESULT_COLUMNS, arrays)), index=index)
+
+    def score_stream(self, batches):
+        """
+        Scores an iterable of batches lazily, one result per batch
+
+        Args:
+            batches: Iterable of batches, see `score_arrays`
+
+        Yields: The result of `score` for each batch
+        """
+        for batch in batches:
+            yield self.score(batch)
+
+    def write_stream(self, batches, sink):
+        """
+        Scores batches and writes the results to an Arrow IPC stream as they come
+
+        Requires the optional `pyarrow` package.
+
+        Args:
+            batches: Iterable of batches, see `score_arrays`
+            sink: Path, str or writable file-like object
+
+        Returns: Int, number of rows written
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as err:
+            raise ImportError("write_stream requires the `pyarrow` package") from err
+
+        if isinstance(sink, os.PathLike):
+            sink = os.fspath(sink)
+        schema = pa.schema([(name, pa.float64()) for name in RESULT_COLUMNS])
+        n_rows = 0
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                arrays = self.score_arrays(batch)
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays(
+                        [pa.array(a) for a in arrays], schema=schema
+                    )
+                )
+                n_rows += len(arrays[0])
+        return n_rows
@@ -0,0 +1,321 @@
+"""
+Streaming samplers for the structural causal models used in notebook 1.
+
+``StructuralCausalModel.sample`` materializes every draw in a single pandas
+DataFrame, which is fine for the notebook's 100,000 rows but not for simulation
+studies with hundreds of millions of rows. ``iter_sample_chunks`` evaluates the
+same node assignments a fixed number of rows at a time, in topological order,
+and yields one NumPy block per chunk, so memory stays bounded by the chunk size.
+``write_parquet`` and ``write_npy`` stream those blocks straight to disk.
+
+The samplers only rely on ``scm.assignment``, which maps each node to either
+``None`` (an intervened-on node) or a callable with a ``parents`` attribute, so
+they work with any model built from ``linear_model``, ``logistic_model`` or
+plain lambdas.
+
+``sample_parallel`` spreads the chunks over a process pool. Every chunk gets its
+own child of a ``numpy.random.SeedSequence``, so a fixed seed reproduces the same
+bytes no matter how many workers are used. Workers are started with the
+platform's default method, which sends them the model pickled, so assignments
+written as lambdas (like the root nodes of notebook 1) are sampled in the
+calling process instead.
+"""
+
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from causal_tutorial import dag
+
+# Populated in each worker process by `_init_sampler`
+_WORKER_STATE = {}
+
+
+def topological_order(scm):
+    """
+    Orders the nodes of an SCM so that every parent comes before its children
+
+    Nodes that don't depend on each other keep the order they were declared in.
+
+    Args:
+        scm: StructuralCausalModel
+
+    Returns: List of str
+    """
+    return dag.topological_order(
+        {
+            node: model.parents if model is not None else ()
+            for node, model in scm.assignment.items()
+        }
+    )
+
+
+def _set_value_slice(value, start, stop):
+    value = np.asarray(value)
+    if value.ndim == 0:
+        return np.full(stop - start, value)
+    return value[start:stop]
+
+
+def _sample_rows(scm, order, start, stop, set_values):
+    """
+    Evaluates every node for rows [start, stop) and returns a dict of arrays
+    """
+    n_rows = stop - start
+    samples = {}
+    for node in order:
+        model = scm.assignment[node]
+        if model is None:
+            if node not in set_values:
+                raise ValueError(f"No value given for intervened-on node '{node}'")
+            samples[node] = _set_value_slice(set_values[node], start, stop)
+        else:
+            kwargs = {parent: samples[parent] for parent in model.parents}
+            kwargs["n_samples"] = n_rows
+            samples[node] = model(**kwargs)
+    return samples
+
+
+def iter_sample_chunks(
+    scm, n_samples, chunk_size=1_000_000, set_values=None, dtype=np.float64
+):
+    """
+    Samples from an SCM in fixed-size chunks
+
+    Args:
+        scm: StructuralCausalModel
+        n_samples: Int, total number of rows to draw
+        chunk_size: Int, maximum number of rows per chunk
+        set_values: Optional dict mapping intervened-on nodes to a scalar or to an
+            array of length `n_samples`
+        dtype: NumPy dtype of the yielded blocks
+
+    Returns: Generator of column-major arrays of shape (chunk_rows, n_nodes). The
+        columns follow `topological_order(scm)`.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    set_values = set_values or {}
+    order = topological_order(scm)
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        samples = _sample_rows(scm, order, start, stop, set_values)
+        block = np.empty((stop - start, len(order)), dtype=dtype, order="F")
+        for col, node in enumerate(order):
+            block[:, col] = samples[node]
+        yield block
+
+
+def write_npy(
+    scm, path, n_samples, chunk_size=1_000_000, set_values=None, dtype=np.float64
+):
+    """
+    Streams SCM samples into a memory-mapped `.npy` file
+
+    The file is written in Fortran order, so every variable is contiguous on disk
+    and can later be read back with `np.load(path, mmap_mode="r")`.
+
+    Args:
+        scm: StructuralCausalModel
+        path: Path or str of the `.npy` file to create
+        n_samples: Int, total number of rows to draw
+        chunk_size: Int, maximum number of rows held in memory at once
+        set_values: Optional dict, see `iter_sample_chunks`
+        dtype: NumPy dtype of the stored array
+
+    Returns: List of str, the column names in the order they were stored
+    """
+    order = topological_order(scm)
+    out = np.lib.format.open_memmap(
+        path, mode="w+", dtype=dtype, shape=(n_samples, len(order)), fortran_order=True
+    )
+    start = 0
+    for block in iter_sample_chunks(scm, n_samples, chunk_size, set_values, dtype):
+        out[start : start + len(block)] = block
+        start += len(block)
+    out.flush()
+    del out
+    return order
+
+
+def write_parquet(
+    scm,
+    path,
+    n_samples,
+    chunk_size=1_000_000,
+    set_values=None,
+    dtype=np.float64,
+    compression="snappy",
+):
+    """
+    Streams SCM samples into a Parquet file, one row group per chunk
+
+    Requires the optional `pyarrow` package.
+
+    Args:
+        scm: StructuralCausalModel
+        path: Path or str of the Parquet file to create
+        n_samples: Int, total number of rows to draw
+        chunk_size: Int, maximum number of rows held in memory at once
+        set_values: Optional dict, see `iter_sample_chunks`
+        dtype: NumPy dtype of the stored columns
+        compression: Str, Parquet compression codec
+
+    Returns: List of str, the column names in the order they were stored
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as err:
+        raise ImportError("write_parquet requires the `pyarrow` package") from err
+
+    order = topological_order(scm)
+    schema = pa.schema([(node, pa.from_numpy_dtype(np.dtype(dtype))) for node in order])
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for block in iter_sample_chunks(scm, n_samples, chunk_size, set_values, dtype):
+            columns = [pa.array(block[:, col]) for col in range(len(order))]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    return order
+
+
+def _init_sampler(compiled, set_values, dtype, path):
+    _WORKER_STATE.update(
+        compiled=compiled, set_values=set_values, dtype=dtype, path=path
+    )
+
+
+def _sample_chunk(task):
+    start, stop, seed_seq = task
+    compiled = _WORKER_STATE["compiled"]
+    set_values = {
+        node: _set_value_slice(value, start, stop)
+        for node, value in _WORKER_STATE["set_values"].items()
+    }
+
+    # Root lambdas draw from the global np.random state, so reseed it from the
+    # chunk's own stream. Linear / logistic noise comes from a separate Generator.
+    legacy_seq, generator_seq = seed_seq.spawn(2)
+    np.random.seed(legacy_seq.generate_state(4))
+    block = compiled.sample(
+        stop - start,
+        set_values=set_values,
+        rng=np.random.default_rng(generator_seq),
+        dtype=_WORKER_STATE["dtype"],
+    )
+
+    path = _WORKER_STATE["path"]
+    if path is None:
+        return start, block
+    out = np.load(path, mmap_mode="r+")
+    out[start:stop] = block
+    out.flush()
+    return start, None
+
+
+def _picklable(obj):
+    try:
+        pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def sample_parallel(
+    scm,
+    n_samples,
+    seed,
+    chunk_size=1_000_000,
+    max_workers=None,
+    set_values=None,
+    dtype=np.float64,
+    path=None,
+):
+    """
+    Samples from an SCM on a process pool with reproducible, independent streams
+
+    Rows are split into chunks of `chunk_size`, and chunk `i` always draws from
+    the `i`-th child of `seed`, so the output only depends on `seed` and
+    `chunk_size`, never on `max_workers`. Root lambdas that call the global
+    `np.random` functions are reseeded per chunk too.
+
+    Workers receive the model pickled, whatever the platform's start method.
+    When an assignment can't be pickled (a lambda or a function defined inside
+    a notebook cell), a warning is raised and every chunk is sampled in this
+    process, which gives the same rows. Define the assignments with
+    `linear_model` / `logistic_model` or module-level functions to use the pool.
+
+    Args:
+        scm: StructuralCausalModel
+        n_samples: Int, total number of rows to draw
+        seed: Int or numpy.random.SeedSequence
+        chunk_size: Int, number of rows per task
+        max_workers: Optional int, size of the process pool (defaults to the
+            number of CPUs). Use 1 to sample every chunk in this process.
+        set_values: Optional dict, see `iter_sample_chunks`
+        dtype: np.float64 or np.float32
+        path: Optional path of a `.npy` file. When given, workers write their
+            chunks straight into it as a memmap instead of sending them back.
+
+    Returns: Tuple (samples, columns). `samples` is a column-major array of shape
+        (n_samples, n_nodes), memory-mapped when `path` is given, and `columns`
+        lists the node names in column order.
+    """
+    from causal_tutorial.compiled_scm import CompiledSCM
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    compiled = CompiledSCM(scm)
+    shape = (n_samples, len(compiled.columns))
+    if path is None:
+        out = np.empty(shape, dtype=dtype, order="F")
+    else:
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=shape, fortran_order=True
+        )
+        out.flush()
+
+    starts = range(0, n_samples, chunk_size)
+    tasks = [
+        (start, min(start + chunk_size, n_samples), chunk_seed)
+        for start, chunk_seed in zip(starts, seed.spawn(len(starts)))
+    ]
+    state = (compiled, set_values or {}, dtype, None if path is None else str(path))
+
+    def collect(results):
+        for start, block in results:
+            if block is not None:
+                out[start : start + len(block)] = block
+
+    if max_workers != 1 and not _picklable(compiled):
+        warnings.warn(
+            "The SCM has assignments that can't be pickled (lambdas or locally "
+            "defined functions), so its chunks are sampled in this process. "
+            "Use module-level functions to sample on a process pool.",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+        max_workers = 1
+
+    if max_workers == 1:
+        _init_sampler(*state)
+        # Chunks reseed the global np.random state, so put the caller's back after
+        global_state = np.random.get_state()
+        try:
+            collect(map(_sample_chunk, tasks))
+        finally:
+            np.random.set_state(global_state)
+            _WORKER_STATE.clear()
+    else:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_sampler, initargs=state
+        ) as pool:
+            collect(pool.map(_sample_chunk, tasks))
+
+    if path is not None:
+        out.flush()
+    return out, compiled.columns
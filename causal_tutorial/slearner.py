@@ -0,0 +1,237 @@
+"""
+G-computation / S-learner helpers for notebook 2.
+
+The notebook estimates counterfactual churn by copying the whole dataset twice,
+forcing the treatment column to 1 and 0, and scoring each copy separately. The
+helpers here do the same thing on a single stacked NumPy design matrix: the
+treated and control versions of every row are scored in one ``predict_proba``
+call, and ATE, ATT and ATC are all read off the same pair of predictions.
+"""
+
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+from sklearn.base import clone
+
+
+@dataclass(frozen=True)
+class TreatmentEffects:
+    """
+    Average treatment effects implied by a set of counterfactual predictions
+
+    Attributes:
+        ate: Average treatment effect over the whole population
+        att: Average treatment effect among the originally treated
+        atc: Average treatment effect among the originally untreated
+        treated_mean: Mean predicted outcome when everyone is treated
+        control_mean: Mean predicted outcome when nobody is treated
+        n_treated: Number of originally treated rows
+        n_control: Number of originally untreated rows
+    """
+
+    ate: float
+    att: float
+    atc: float
+    treated_mean: float
+    control_mean: float
+    n_treated: int
+    n_control: int
+
+
+def stack_counterfactuals(X, treatment_idx):
+    """
+    Builds the treated and control design matrices as one stacked array
+
+    Args:
+        X: 2-D array of shape (n_rows, n_features)
+        treatment_idx: Int, column index of the binary treatment in `X`
+
+    Returns: Array of shape (2 * n_rows, n_features). The first `n_rows` rows
+        have the treatment forced to 1, the last `n_rows` have it forced to 0.
+    """
+    X = np.asarray(X)
+    n_rows = X.shape[0]
+    stacked = np.empty((2 * n_rows, X.shape[1]), dtype=np.float64)
+    stacked[:n_rows] = X
+    stacked[n_rows:] = X
+    stacked[:n_rows, treatment_idx] = 1.0
+    stacked[n_rows:, treatment_idx] = 0.0
+    return stacked
+
+
+def _predict_positive(model, X):
+    """
+    Returns P(y = 1) for a fitted classifier scored on a bare array
+    """
+    with warnings.catch_warnings():
+        # Models fitted on a DataFrame warn when scored on an ndarray, even if
+        # the column order is the same. We check the order ourselves.
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return model.predict_proba(X)[:, 1]
+
+
+def predict_counterfactuals(model, X, treatment_idx, chunk_size=None):
+    """
+    Scores every row under both treatment arms with a single predict_proba call
+
+    Args:
+        model: Fitted classifier exposing `predict_proba`
+        X: 2-D array of shape (n_rows, n_features)
+        treatment_idx: Int, column index of the binary treatment in `X`
+        chunk_size: Optional int, number of rows to stack and score at a time.
+            Leave as None to score everything at once; set it to bound peak
+            memory on very large tables.
+
+    Returns: Tuple of arrays (mu1, mu0), the predicted outcome probability of each
+        row when treated and when untreated
+    """
+    X = np.asarray(X)
+    n_rows = X.shape[0]
+    if chunk_size is None or chunk_size >= n_rows:
+        probs = _predict_positive(model, stack_counterfactuals(X, treatment_idx))
+        return probs[:n_rows], probs[n_rows:]
+
+    mu1 = np.empty(n_rows, dtype=np.float64)
+    mu0 = np.empty(n_rows, dtype=np.float64)
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        probs = _predict_positive(
+            model, stack_counterfactuals(X[start:stop], treatment_idx)
+        )
+        mu1[start:stop] = probs[: stop - start]
+        mu0[start:stop] = probs[stop - start :]
+    return mu1, mu0
+
+
+def summarize_effects(mu1, mu0, treated):
+    """
+    Collapses per-row counterfactual predictions into ATE, ATT and ATC
+
+    Args:
+        mu1: Array of predicted outcomes under treatment
+        mu0: Array of predicted outcomes under control
+        treated: Boolean-like array of the originally observed treatment
+
+    Returns: TreatmentEffects
+    """
+    treated = np.asarray(treated).astype(bool)
+    diff = mu1 - mu0
+    n_treated = int(treated.sum())
+    n_control = int(treated.size - n_treated)
+    return TreatmentEffects(
+        ate=float(diff.mean()),
+        att=float(diff[treated].mean()) if n_treated else float("nan"),
+        atc=float(diff[~treated].mean()) if n_control else float("nan"),
+        treated_mean=float(mu1.mean()),
+        control_mean=float(mu0.mean()),
+        n_treated=n_treated,
+        n_control=n_control,
+    )
+
+
+class SLearner:
+    """
+    A single outcome model that takes the treatment in as just another feature
+
+    Args:
+        model: Unfitted scikit-learn style classifier (it is cloned on `fit`), an
+            already fitted one if you only want to call `effects`, or the name of
+            a learner in `causal_tutorial.learners.LEARNERS`
+        features: List of str, the model's feature columns, in order
+        treatment: Str, name of the binary treatment column (must be in `features`)
+        categorical: Iterable of str, feature columns holding category codes,
+            only used when `model` is a learner name
+        random_state: Optional int seed, only used when `model` is a learner name
+    """
+
+    def __init__(self, model, features, treatment, categorical=(), random_state=None):
+        if treatment not in features:
+            raise ValueError(
+                f"Treatment column '{treatment}' must be one of the features"
+            )
+        from causal_tutorial.learners import resolve_learner
+
+        self.features = list(features)
+        self.model = resolve_learner(model, self.features, categorical, random_state)
+        self.treatment = treatment
+        self.treatment_idx = self.features.index(treatment)
+
+    def _design(self, df):
+        return df[self.features].to_numpy(dtype=np.float64)
+
+    def _check_feature_order(self):
+        fitted_names = getattr(self.model, "feature_names_in_", None)
+        if fitted_names is not None and list(fitted_names) != self.features:
+            raise ValueError(
+                "The model was fitted on a different feature order than "
+                f"{self.features}"
+            )
+
+    def fit(self, df, outcome):
+        """
+        Fits a fresh clone of the outcome model on `df`
+
+        Args:
+            df: DataFrame containing the feature and outcome columns
+            outcome: Str, name of the outcome column
+
+        Returns: self
+        """
+        self.model = clone(self.model).fit(self._design(df), df[outcome].to_numpy())
+        return self
+
+    def predict_counterfactuals(self, df, chunk_size=None):
+        """
+        Per-row predicted outcomes under treatment and under control
+
+        Args:
+            df: DataFrame containing the feature columns
+            chunk_size: Optional int, see `predict_counterfactuals`
+
+        Returns: Tuple of arrays (mu1, mu0)
+        """
+        self._check_feature_order()
+        return predict_counterfactuals(
+            self.model, self._design(df), self.treatment_idx, chunk_size=chunk_size
+        )
+
+    def effects(self, df, chunk_size=None):
+        """
+        ATE, ATT and ATC for the rows of `df`
+
+        Args:
+            df: DataFrame containing the feature columns
+            chunk_size: Optional int, see `predict_counterfactuals`
+
+        Returns: TreatmentEffects
+        """
+        self._check_feature_order()
+        X = self._design(df)
+        mu1, mu0 = predict_counterfactuals(
+            self.model, X, self.treatment_idx, chunk_size=chunk_size
+        )
+        return summarize_effects(mu1, mu0, X[:, self.treatment_idx])
+
+    def bootstrap(self, df, outcome, n_replicates=1000, **kwargs):
+        """
+        Bootstrap confidence intervals by refitting the model on resamples of `df`
+
+        Args:
+            df: DataFrame containing the feature and outcome columns
+            outcome: Str, name of the outcome column
+            n_replicates: Int, number of bootstrap resamples
+            **kwargs: Passed on to `causal_tutorial.bootstrap.bootstrap_effects`
+
+        Returns: BootstrapResult
+        """
+        from causal_tutorial.bootstrap import bootstrap_effects
+
+        return bootstrap_effects(
+            self.model,
+            self._design(df),
+            df[outcome].to_numpy(),
+            self.treatment_idx,
+            n_replicates=n_replicates,
+            **kwargs,
+        )
@@ -0,0 +1,435 @@
+"""
+One-pass summary statistics for the associations explored in notebook 1.
+
+``scipy.stats.pearsonr`` needs both columns in memory at once. The accumulator
+here keeps only a count, two means and three co-moments per variable pair. It
+can be fed chunk by chunk, and partial results computed on different chunks or
+processes can be merged with the pairwise update of Chan, Golub & LeVeque. The
+resulting r and p-value follow ``pearsonr`` exactly.
+
+``stratified_association`` does the notebook's "control for a variable by
+filtering to one of its values" for every value at once, and pools the
+per-stratum estimates. ``GroupedLeastSquares`` keeps the same per-stratum
+aggregates so the least-squares line for any union of strata (the raw data, one
+filtered subset, many candidate subsets) is read off without rescanning the rows.
+"""
+
+from collections import namedtuple
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import special
+
+PearsonResult = namedtuple("PearsonResult", ["statistic", "pvalue"])
+
+
+def pearson_pvalue(r, n, alternative="two-sided"):
+    """
+    P-value of a Pearson correlation, computed the same way as scipy.stats.pearsonr
+
+    Under the null hypothesis r follows a beta distribution on (-1, 1) with
+    a = b = n / 2 - 1.
+
+    Args:
+        r: Float or array, correlation coefficient(s)
+        n: Int or array, number of observations behind each `r`
+        alternative: Str, one of "two-sided", "less" or "greater"
+
+    Returns: Float or array
+    """
+    r = np.asarray(r, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    ab = n / 2 - 1
+    if alternative == "two-sided":
+        pvalue = 2 * special.betaincc(ab, ab, (np.abs(r) + 1) / 2)
+    elif alternative == "less":
+        pvalue = special.betainc(ab, ab, (r + 1) / 2)
+    elif alternative == "greater":
+        pvalue = special.betaincc(ab, ab, (r + 1) / 2)
+    else:
+        raise ValueError("alternative must be 'two-sided', 'less' or 'greater'")
+    # pearsonr returns exactly 1.0 for two observations
+    pvalue = np.where(n == 2, np.where(np.isnan(r), np.nan, 1.0), pvalue)
+    return pvalue[()] if pvalue.ndim == 0 else pvalue
+
+
+class CorrelationAccumulator:
+    """
+    Streaming Pearson correlation between two variables
+
+    Attributes:
+        n: Int, number of observations seen
+        mean_x, mean_y: Float, running means
+        m2_x, m2_y: Float, running sums of squared deviations from the mean
+        c_xy: Float, running sum of cross-deviations from the means
+    """
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, m2_x=0.0, m2_y=0.0, c_xy=0.0):
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.m2_y = m2_y
+        self.c_xy = c_xy
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n={self.n}, r={self.statistic:.4f})"
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        """
+        Builds an accumulator from one chunk of paired observations
+
+        Args:
+            x: 1-D array
+            y: 1-D array of the same length
+
+        Returns: CorrelationAccumulator
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.shape != y.shape or x.ndim != 1:
+            raise ValueError("x and y must be 1-D arrays of the same length")
+        if not len(x):
+            return cls()
+        mean_x = x.mean()
+        mean_y = y.mean()
+        dx = x - mean_x
+        dy = y - mean_y
+        return cls(len(x), mean_x, mean_y, dx @ dx, dy @ dy, dx @ dy)
+
+    def merge(self, other):
+        """
+        Combines two accumulators as if their observations had been seen together
+
+        Args:
+            other: CorrelationAccumulator
+
+        Returns: New CorrelationAccumulator
+        """
+        if not other.n:
+            return CorrelationAccumulator(*self._state())
+        if not self.n:
+            return CorrelationAccumulator(*other._state())
+        n = self.n + other.n
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        return CorrelationAccumulator(
+            n,
+            self.mean_x + delta_x * other.n / n,
+            self.mean_y + delta_y * other.n / n,
+            self.m2_x + other.m2_x + delta_x * delta_x * weight,
+            self.m2_y + other.m2_y + delta_y * delta_y * weight,
+            self.c_xy + other.c_xy + delta_x * delta_y * weight,
+        )
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def update(self, x, y):
+        """
+        Folds another chunk of observations into this accumulator in place
+
+        Args:
+            x: 1-D array
+            y: 1-D array of the same length
+
+        Returns: self
+        """
+        merged = self.merge(CorrelationAccumulator.from_arrays(x, y))
+        (
+            self.n,
+            self.mean_x,
+            self.mean_y,
+            self.m2_x,
+            self.m2_y,
+            self.c_xy,
+        ) = merged._state()
+        return self
+
+    def _state(self):
+        return self.n, self.mean_x, self.mean_y, self.m2_x, self.m2_y, self.c_xy
+
+    @property
+    def statistic(self):
+        """
+        Pearson correlation coefficient of everything seen so far
+        """
+        if self.n < 2:
+            return float("nan")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = self.c_xy / np.sqrt(self.m2_x * self.m2_y)
+        return float(np.clip(r, -1.0, 1.0))
+
+    def line(self):
+        """
+        Least-squares line of y on x for everything seen so far
+
+        Returns: Tuple of floats (slope, intercept), the same as np.polyfit(x, y, 1)
+        """
+        if self.n < 2:
+            raise ValueError("At least two observations are needed")
+        slope = self.c_xy / self.m2_x
+        return float(slope), float(self.mean_y - slope * self.mean_x)
+
+    def result(self, alternative="two-sided"):
+        """
+        Correlation and p-value, in the same form as scipy.stats.pearsonr
+
+        Args:
+            alternative: Str, one of "two-sided", "less" or "greater"
+
+        Returns: PearsonResult(statistic, pvalue), which also unpacks as (r, p)
+        """
+        if self.n < 2:
+            raise ValueError("At least two observations are needed")
+        r = self.statistic
+        if self.n == 2 and not np.isnan(r):
+            r = float(np.round(r))
+        return PearsonResult(r, float(pearson_pvalue(r, self.n, alternative)))
+
+
+def streaming_pearsonr(chunks, alternative="two-sided"):
+    """
+    Pearson correlation over an iterable of (x, y) chunks
+
+    Args:
+        chunks: Iterable of (x, y) pairs of 1-D arrays
+        alternative: Str, one of "two-sided", "less" or "greater"
+
+    Returns: PearsonResult(statistic, pvalue)
+    """
+    acc = CorrelationAccumulator()
+    for x, y in chunks:
+        acc.update(x, y)
+    return acc.result(alternative)
+
+
+def _grouped_moments(x, y, strata):
+    """
+    Per-level count, means and centered co-moments of (x, y) in one grouped pass
+
+    Returns: Tuple (levels, (n, mean_x, mean_y, s_xx, s_yy, s_xy)), with one
+        entry per sorted level of `strata`. Rows with a missing stratum are dropped.
+    """
+    import pandas as pd
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.shape != y.shape or x.ndim != 1:
+        raise ValueError("x and y must be 1-D arrays of the same length")
+    codes, levels = pd.factorize(np.asarray(strata), sort=True)
+    if (codes < 0).any():
+        keep = codes >= 0
+        x, y, codes = x[keep], y[keep], codes[keep]
+    n_levels = len(levels)
+
+    n = np.bincount(codes, minlength=n_levels).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = np.bincount(codes, weights=x, minlength=n_levels) / n
+        mean_y = np.bincount(codes, weights=y, minlength=n_levels) / n
+    dx = x - mean_x[codes]
+    dy = y - mean_y[codes]
+    s_xx = np.bincount(codes, weights=dx * dx, minlength=n_levels)
+    s_yy = np.bincount(codes, weights=dy * dy, minlength=n_levels)
+    s_xy = np.bincount(codes, weights=dx * dy, minlength=n_levels)
+    return levels, (n, mean_x, mean_y, s_xx, s_yy, s_xy)
+
+
+@dataclass(frozen=True)
+class StratifiedAssociation:
+    """
+    Per-stratum and pooled association between two variables
+
+    Attributes:
+        table: DataFrame indexed by stratum level with columns n, r, pvalue,
+            slope, intercept and slope_se
+        pooled_slope: Float, inverse-variance weighted mean of the stratum slopes
+        pooled_slope_se: Float, standard error of `pooled_slope`
+        pooled_r: Float, stratum correlations pooled on the Fisher z scale with
+            weights n - 3
+        pooled_r_pvalue: Float, two-sided p-value of `pooled_r`
+    """
+
+    table: object
+    pooled_slope: float
+    pooled_slope_se: float
+    pooled_r: float
+    pooled_r_pvalue: float
+
+
+def stratified_association(x, y, strata, min_size=3):
+    """
+    Correlation and regression slope of y on x within every level of `strata`
+
+    Filtering to one stratum at a time (`data[data['temperature'] == 20]`) costs a
+    full scan per level. Here the rows are grouped once, and every stratum's
+    sums and co-moments come out of a few `np.bincount` passes over the data.
+
+    Args:
+        x: 1-D array-like
+        y: 1-D array-like of the same length
+        strata: 1-D array-like of the conditioning variable
+        min_size: Int, strata with fewer rows get NaN estimates and are left
+            out of the pooled values
+
+    Returns: StratifiedAssociation
+    """
+    import pandas as pd
+
+    levels, (n, mean_x, mean_y, s_xx, s_yy, s_xy) = _grouped_moments(x, y, strata)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        small = n < max(min_size, 3)
+        slope = np.where(small, np.nan, s_xy / s_xx)
+        intercept = mean_y - slope * mean_x
+        rss = np.maximum(s_yy - slope * s_xy, 0.0)
+        slope_se = np.sqrt(rss / (n - 2) / s_xx)
+        r = np.clip(np.where(small, np.nan, s_xy / np.sqrt(s_xx * s_yy)), -1.0, 1.0)
+        pvalue = pearson_pvalue(r, np.maximum(n, 2))
+
+        # Inverse-variance pooling of slopes, Fisher-z pooling of correlations
+        usable = np.isfinite(slope_se) & (slope_se > 0)
+        weights = 1.0 / slope_se[usable] ** 2
+        pooled_slope = float(np.sum(weights * slope[usable]) / np.sum(weights))
+        pooled_slope_se = float(1.0 / np.sqrt(np.sum(weights)))
+
+        usable_r = np.isfinite(r) & (np.abs(r) < 1) & (n > 3)
+        z_weights = n[usable_r] - 3
+        pooled_z = np.sum(z_weights * np.arctanh(r[usable_r])) / np.sum(z_weights)
+        pooled_r = float(np.tanh(pooled_z))
+        pooled_r_pvalue = float(
+            special.erfc(abs(pooled_z) * np.sqrt(np.sum(z_weights)) / np.sqrt(2))
+        )
+
+    table = pd.DataFrame(
+        {
+            "n": n.astype(np.int64),
+            "r": r,
+            "pvalue": pvalue,
+            "slope": slope,
+            "intercept": intercept,
+            "slope_se": slope_se,
+        },
+        index=pd.Index(levels, name="stratum"),
+    )
+    return StratifiedAssociation(
+        table, pooled_slope, pooled_slope_se, pooled_r, pooled_r_pvalue
+    )
+
+
+class GroupedLeastSquares:
+    """
+    Least-squares lines of y on x for any union of strata, from one pass over the data
+
+    The notebook compares the "Raw" line with a "Badly adjusted" one by calling
+    `np.polyfit` on the full data and again on a filtered copy. Here each
+    stratum's count, means and co-moments are computed once, and the line for a
+    selection of strata is built by merging those aggregates, so every further
+    fit costs O(levels) instead of O(rows).
+
+    Args:
+        x: 1-D array-like
+        y: 1-D array-like of the same length
+        strata: Optional 1-D array-like of the conditioning variable. Without
+            it, only the line over all rows is available.
+
+    Attributes:
+        levels: Index of the sorted stratum levels
+        n, mean_x, mean_y, s_xx, s_yy, s_xy: Arrays with one entry per level
+    """
+
+    def __init__(self, x, y, strata=None):
+        import pandas as pd
+
+        if strata is None:
+            strata = np.zeros(len(np.asarray(x)), dtype=np.int8)
+        levels, moments = _grouped_moments(x, y, strata)
+        self.levels = pd.Index(levels)
+        self.n, self.mean_x, self.mean_y, self.s_xx, self.s_yy, self.s_xy = moments
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(n={int(self.n.sum())}, "
+            f"levels={len(self.levels)})"
+        )
+
+    def _selection(self, levels):
+        """
+        Converts `levels` to a 2-D boolean matrix of shape (n_selections, n_levels)
+        """
+        if levels is None:
+            return np.ones((1, len(self.levels)), dtype=bool)
+        levels = np.asarray(levels)
+        if levels.dtype == bool:
+            if levels.shape[-1] != len(self.levels):
+                raise ValueError(
+                    f"Boolean masks must have one entry per level ({len(self.levels)})"
+                )
+            return np.atleast_2d(levels)
+        codes = self.levels.get_indexer(levels.ravel())
+        if (codes < 0).any():
+            missing = levels.ravel()[codes < 0].tolist()
+            raise ValueError(f"Levels {missing} are not in the data")
+        mask = np.zeros((1, len(self.levels)), dtype=bool)
+        mask[0, codes] = True
+        return mask
+
+    def moments(self, masks):
+        """
+        Pooled count, means and co-moments for each row of a boolean level mask
+
+        Args:
+            masks: Boolean array of shape (n_selections, n_levels)
+
+        Returns: Tuple of arrays (n, mean_x, mean_y, s_xx, s_yy, s_xy), each of
+            length n_selections
+        """
+        masks = np.asarray(masks, dtype=np.float64)
+        n = masks @ self.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_x = masks @ (self.n * self.mean_x) / n
+            mean_y = masks @ (self.n * self.mean_y) / n
+        # Chan et al.'s merge, applied to all selected strata at once
+        dx = self.mean_x[None, :] - mean_x[:, None]
+        dy = self.mean_y[None, :] - mean_y[:, None]
+        weighted = masks * self.n
+        s_xx = masks @ self.s_xx + np.sum(weighted * dx * dx, axis=1)
+        s_yy = masks @ self.s_yy + np.sum(weighted * dy * dy, axis=1)
+        s_xy = masks @ self.s_xy + np.sum(weighted * dx * dy, axis=1)
+        return n, mean_x, mean_y, s_xx, s_yy, s_xy
+
+    def lines(self, masks):
+        """
+        Least-squares slopes and intercepts for many selections of strata at once
+
+        Args:
+            masks: Boolean array of shape (n_selections, n_levels), one row per
+                selection, with columns following `levels`
+
+        Returns: Tuple of arrays (slopes, intercepts). Selections with fewer
+            than two rows or no spread in x get NaN.
+        """
+        n, mean_x, mean_y, s_xx, _, s_xy = self.moments(self._selection(masks))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slopes = np.where(n >= 2, s_xy / s_xx, np.nan)
+        return slopes, mean_y - slopes * mean_x
+
+    def line(self, levels=None):
+        """
+        Least-squares line of y on x over the rows in the selected strata
+
+        Args:
+            levels: Optional list of stratum values, or a boolean mask over
+                `levels`. Defaults to all rows.
+
+        Returns: Tuple of floats (slope, intercept), the same as np.polyfit(x, y, 1)
+            on the selected rows
+        """
+        selection = self._selection(levels)
+        if len(selection) != 1:
+            raise ValueError("line() takes a single selection, use lines() for many")
+        if self.moments(selection)[0][0] < 2:
+            raise ValueError("At least two observations are needed")
+        slopes, intercepts = self.lines(selection)
+        return float(slopes[0]), float(intercepts[0])
@@ -0,0 +1,240 @@
+"""
+Checks a causal DAG against data through the conditional independences it implies.
+
+Every pair of non-adjacent nodes in a DAG is independent given the parents of
+whichever one comes later in topological order (the local Markov property), so
+the graph can be tested without fitting any causal model. ``validate_dag``
+enumerates that basis of independences and tests all of them in one go:
+
+* pairs of numeric columns get a partial-correlation (Fisher z) test. The
+  covariance matrix of all columns, categoricals one-hot encoded, is computed in
+  a single pass over the data, and every test sharing a conditioning set is read
+  off one Schur complement of it.
+* pairs involving a categorical column get a stratified G-test (or Pearson
+  chi-square test). Numeric columns are cut into quantile bins for it, and all
+  strata are counted in one ``np.bincount`` call.
+
+The result is a table ranked from the most to the least suspicious independence.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+from causal_tutorial.dseparation import BitDAG, DSeparationOracle
+
+METHODS = ("g-test", "chi2")
+
+
+def implied_independencies(graph):
+    """
+    Basis set of conditional independences implied by a DAG
+
+    For every pair of non-adjacent nodes (x, y), with y after x in topological
+    order, the DAG implies x _||_ y | parents(y).
+
+    Args:
+        graph: StructuralCausalModel, causal graphical model, networkx DiGraph,
+            edge list or BitDAG
+
+    Returns: List of (x, y, given) tuples, `given` being a tuple of node names
+    """
+    dag = BitDAG.from_graph(graph)
+    out = []
+    for later, j in enumerate(dag.order):
+        for i in dag.order[:later]:
+            if dag.parents[j] >> i & 1:
+                continue
+            out.append((dag.nodes[i], dag.nodes[j], dag.names(dag.parents[j])))
+    return out
+
+
+def _is_categorical(series):
+    return not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(
+        series
+    )
+
+
+def _design(data, columns):
+    """
+    Numeric design matrix with categoricals one-hot encoded (first level dropped)
+
+    Returns: Tuple (matrix, positions), positions mapping each column name to the
+        list of matrix columns it became
+    """
+    blocks = []
+    positions = {}
+    width = 0
+    for column in columns:
+        series = data[column]
+        if _is_categorical(series):
+            block = pd.get_dummies(series, drop_first=True, dtype=np.float64)
+            block = block.to_numpy()
+        else:
+            block = series.to_numpy(dtype=np.float64)[:, None]
+        positions[column] = list(range(width, width + block.shape[1]))
+        width += block.shape[1]
+        blocks.append(block)
+    return np.hstack(blocks), positions
+
+
+def _codes(series, n_bins):
+    """
+    Integer codes of a column for the contingency tests, binning wide numerics
+    """
+    if not _is_categorical(series) and series.nunique() > n_bins:
+        series = pd.qcut(series, n_bins, duplicates="drop")
+    codes, _ = pd.factorize(series, sort=True)
+    return codes
+
+
+def _partial_correlations(cov, positions, tests, n):
+    """
+    Fisher-z tests for numeric pairs, one Schur complement per conditioning set
+    """
+    results = {}
+    by_given = {}
+    for key in tests:
+        by_given.setdefault(key[2], []).append(key)
+
+    for given, keys in by_given.items():
+        z = [p for node in given for p in positions[node]]
+        targets = sorted({positions[node][0] for key in keys for node in key[:2]})
+        conditional = cov[np.ix_(targets, targets)]
+        if z:
+            cross = cov[np.ix_(z, targets)]
+            coef = np.linalg.lstsq(cov[np.ix_(z, z)], cross, rcond=None)[0]
+            conditional = conditional - cross.T @ coef
+        scale = np.sqrt(np.diag(conditional))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            partial = conditional / np.outer(scale, scale)
+        where = {col: k for k, col in enumerate(targets)}
+        dof = n - len(z) - 3
+        for key in keys:
+            r = partial[where[positions[key[0]][0]], where[positions[key[1]][0]]]
+            r = float(np.clip(r, -1.0, 1.0))
+            statistic = float(np.arctanh(r) * np.sqrt(max(dof, 0)))
+            pvalue = float(special.erfc(abs(statistic) / np.sqrt(2)))
+            results[key] = ("partial-corr", r, statistic, dof, pvalue)
+    return results
+
+
+def _contingency_test(x, y, strata, method):
+    """
+    Stratified G-test or chi-square test of x _||_ y within every stratum
+    """
+    n_x, n_y = x.max() + 1, y.max() + 1
+    n_strata = strata.max() + 1
+    observed = np.bincount(
+        (strata * n_x + x) * n_y + y, minlength=n_strata * n_x * n_y
+    ).reshape(n_strata, n_x, n_y)
+
+    row = observed.sum(axis=2, keepdims=True)
+    col = observed.sum(axis=1, keepdims=True)
+    total = row.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = row * col / total
+        if method == "g-test":
+            terms = np.where(observed > 0, observed * np.log(observed / expected), 0.0)
+            statistic = 2 * terms.sum()
+        else:
+            terms = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+            statistic = terms.sum()
+    dof = int(
+        np.sum(
+            np.maximum((row[:, :, 0] > 0).sum(axis=1) - 1, 0)
+            * np.maximum((col[:, 0, :] > 0).sum(axis=1) - 1, 0)
+        )
+    )
+    pvalue = float(stats.chi2.sf(statistic, dof)) if dof else 1.0
+    # Cramer's V of the pooled statistic, as a scale-free effect size
+    effect = np.sqrt(statistic / len(x) / max(min(n_x, n_y) - 1, 1))
+    return float(effect), float(statistic), dof, pvalue
+
+
+def validate_dag(
+    data, graph, independencies=None, alpha=0.05, n_bins=4, method="g-test"
+):
+    """
+    Tests every conditional independence a DAG implies against a dataset
+
+    Args:
+        data: DataFrame with one column per node of the graph
+        graph: StructuralCausalModel, causal graphical model, networkx DiGraph,
+            edge list or BitDAG
+        independencies: Optional list of (x, y, given) tuples to test instead of
+            `implied_independencies(graph)`. Each must be implied by the graph.
+        alpha: Float, false discovery rate used to flag violations
+        n_bins: Int, number of quantile bins numeric columns are cut into for the
+            contingency tests
+        method: Str, "g-test" or "chi2", the test for pairs with a categorical
+            column
+
+    Returns: DataFrame with columns x, y, given, test, effect (partial
+        correlation, or Cramer's V of the stratified statistic), statistic, dof,
+        pvalue, pvalue_adj (Benjamini-Hochberg) and violated, sorted by p-value
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    oracle = DSeparationOracle(graph)
+    if independencies is None:
+        independencies = implied_independencies(oracle.dag)
+    independencies = [(x, y, tuple(given)) for x, y, given in independencies]
+    if not all(oracle.query(independencies)):
+        raise ValueError("Some of the independencies are not implied by the graph")
+
+    columns = list(oracle.nodes)
+    missing = [column for column in columns if column not in data.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} are missing from the data")
+    data = data[columns].dropna()
+    n = len(data)
+
+    numeric_tests = []
+    table_tests = []
+    for key in independencies:
+        x, y, _ = key
+        if _is_categorical(data[x]) or _is_categorical(data[y]):
+            table_tests.append(key)
+        else:
+            numeric_tests.append(key)
+
+    results = {}
+    if numeric_tests:
+        matrix, positions = _design(data, columns)
+        cov = np.cov(matrix, rowvar=False)
+        results.update(_partial_correlations(cov, positions, numeric_tests, n))
+    if table_tests:
+        codes = {column: _codes(data[column], n_bins) for column in columns}
+        for key in table_tests:
+            x, y, given = key
+            strata = np.zeros(n, dtype=np.int64)
+            for node in given:
+                strata = strata * (codes[node].max() + 1) + codes[node]
+                # Keep the combined codes dense so they can't overflow
+                strata, _ = pd.factorize(strata)
+            results[key] = (
+                method,
+                *_contingency_test(codes[x], codes[y], strata, method),
+            )
+
+    table = pd.DataFrame(
+        [
+            (x, y, ", ".join(map(str, given)), *results[x, y, given])
+            for x, y, given in independencies
+        ],
+        columns=["x", "y", "given", "test", "effect", "statistic", "dof", "pvalue"],
+    )
+    table["pvalue_adj"] = _benjamini_hochberg(table["pvalue"].to_numpy())
+    table["violated"] = table["pvalue_adj"] < alpha
+    return table.sort_values(
+        ["pvalue", "statistic"], ascending=[True, False]
+    ).reset_index(drop=True)
+
+
+def _benjamini_hochberg(pvalues):
+    order = np.argsort(pvalues)
+    ranked = pvalues[order] * len(pvalues) / np.arange(1, len(pvalues) + 1)
+    adjusted = np.empty_like(ranked)
+    adjusted[order] = np.minimum.accumulate(ranked[::-1])[::-1].clip(max=1.0)
+    return adjusted
@@ -1,5 +1,5 @@
 # /// script
-# dependencies = ["causalgraphicalmodels", "matplotlib", "numpy", "scipy"]
+# dependencies = ["graphviz", "matplotlib", "numpy", "pandas", "scipy"]
 # ///
 
 import marimo
@@ -24,27 +24,12 @@ def _(mo):
     return
 
 
-@app.cell
-def _():
-    # Fix the Python <= 3.10 compatibility issue by monkey-patching collections
-    # This must happen before importing causalgraphicalmodels
-    import collections
-    import collections.abc
-
-    # Add the moved classes back to collections for backwards compatibility
-    collections.Iterable = collections.abc.Iterable
-    collections.Mapping = collections.abc.Mapping
-    collections.MutableMapping = collections.abc.MutableMapping
-    collections.MutableSet = collections.abc.MutableSet
-    collections.Callable = collections.abc.Callable
-    return
-
-
 @app.cell
 def _():
     # Some important imports
 
-    from causalgraphicalmodels.csm import StructuralCausalModel, linear_model, logistic_model
+    from causal_tutorial.scm import StructuralCausalModel, linear_model, logistic_model
+    from causal_tutorial.plotting import scatter_with_fit
     import matplotlib.pyplot as plt
     import numpy as np
     from scipy.stats import norm, pearsonr
@@ -57,6 +42,7 @@ def _():
         np,
         pearsonr,
         plt,
+        scatter_with_fit,
     )
 
 
@@ -160,18 +146,15 @@ def _(mo):
 
 
 @app.cell
-def _(data, np, plt):
+def _(data, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax = plt.subplot(111)
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
 
-    # Let's include a line of best fit too
-    a, b = np.polyfit(data['price'], data['bookings'], 1)
-    plt.plot(data['price'], a*data['price']+b, color = "dimgray")
-
-    plt.scatter(data['price'], data['bookings'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data['price'], data['bookings'], ax=ax)
     plt.ylabel("Bookings Each Week", fontsize=16)
     plt.xlabel("Price (USD)", fontsize=16)
     plt.title("Raw correlation between price and bookings each week", fontsize = 16)
@@ -211,22 +194,38 @@ def _(data2, pearsonr):
 
 
 @app.cell
-def _(data2, np, plt):
+def _(data2, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_1 = plt.subplot(111)
     ax_1.spines['top'].set_visible(False)
     ax_1.spines['right'].set_visible(False)
-    a_1, b_1 = np.polyfit(data2['price'], data2['bookings'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data2['price'], a_1 * data2['price'] + b_1, color='dimgray')
-    plt.scatter(data2['price'], data2['bookings'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data2['price'], data2['bookings'], ax=ax_1)
     plt.ylabel('Bookings Each Week', fontsize=16)
     plt.xlabel('Price (USD)', fontsize=16)
     plt.title('Adjusted correlation between price and bookings each week', fontsize=16)
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Picking 20 degrees was arbitrary. `stratified_association` repeats the same restriction for every temperature in the data at once, and pools the per-temperature slopes into one estimate:
+    """)
+    return
+
+
+@app.cell
+def _(data):
+    from causal_tutorial.stats import GroupedLeastSquares, stratified_association
+
+    by_temperature = stratified_association(data['price'], data['bookings'], data['temperature'])
+    print(f"Pooled slope = {round(by_temperature.pooled_slope, 3)} (SE {round(by_temperature.pooled_slope_se, 3)})")
+    by_temperature.table.head()
+    return (GroupedLeastSquares,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -295,17 +294,15 @@ def _(_____, ______, pearsonr):
 
 
 @app.cell
-def _(________, _________, np, plt):
+def _(_________, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_2 = plt.subplot(111)
     ax_2.spines['top'].set_visible(False)
     ax_2.spines['right'].set_visible(False)
-    a_2, b_2 = np.polyfit(_________, ________, 1)
     # Let's create a scatterplot illustrating this relationship
-    # Let's include a line of best fit too
-    plt.plot(_________, a_2 * _________ + b_2, color='dimgray')
-    plt.scatter(_________, _________)
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(_________, _________, ax=ax_2)
     plt.ylabel('Number of Purchases', fontsize=16)
     plt.xlabel('Number of Items Rated', fontsize=16)
     plt.title('Raw correlation between # of ratings and # of purchases', fontsize=16)
@@ -363,17 +360,21 @@ def _(mo):
 
 
 @app.cell
-def _(__________, data_1, np, plt):
+def _(GroupedLeastSquares, __________, data_1, np, plt):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_3 = plt.subplot(111)
     ax_3.spines['top'].set_visible(False)
     ax_3.spines['right'].set_visible(False)
-    a_3, b_3 = np.polyfit(data_1['number_rated_items'], data_1['number_purchases'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data_1['number_rated_items'], a_3 * data_1['number_rated_items'] + b_3, color='steelblue', label='Raw')
-    a_3, b_3 = np.polyfit(__________, __________, 1)
-    plt.plot(__________, a_3 * __________ + b_3, color='firebrick', label='Badly adjusted')
+    # Sums per number_emails value are computed once, both lines come from them
+    fits_3 = GroupedLeastSquares(data_1['number_rated_items'], data_1['number_purchases'], data_1['number_emails'])
+    a_3, b_3 = fits_3.line()
+    # Let's include a line of best fit too, drawn from its two end points
+    ends_3 = np.array([data_1['number_rated_items'].min(), data_1['number_rated_items'].max()])
+    plt.plot(ends_3, a_3 * ends_3 + b_3, color='steelblue', label='Raw')
+    a_3, b_3 = fits_3.line(__________)
+    ends_3 = np.array([__________.min(), __________.max()])
+    plt.plot(ends_3, a_3 * ends_3 + b_3, color='firebrick', label='Badly adjusted')
     plt.legend(loc='upper left')
     plt.ylabel('Number of Purchases', fontsize=16)
     plt.xlabel('Number of Items Rated', fontsize=16)
@@ -453,16 +454,14 @@ def _(__________, pearsonr):
 
 
 @app.cell
-def _(__________, np, plt):
+def _(__________, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_4 = plt.subplot(111)
     ax_4.spines['top'].set_visible(False)
     ax_4.spines['right'].set_visible(False)
-    a_4, b_4 = np.polyfit(__________, __________, 1)
-    # Let's include a line of best fit too
-    plt.plot(__________, a_4 * __________ + b_4, color='dimgray')
-    plt.scatter(__________, __________)
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(__________, __________, ax=ax_4)
     plt.ylabel('Number of Rides', fontsize=16)
     plt.xlabel('Number of Advertisements', fontsize=16)
     plt.title('Raw correlation between advertisements shown and rides taken', fontsize=16)
@@ -506,17 +505,20 @@ def _(__________, pearsonr):
 
 
 @app.cell
-def _(__________, np, plt):
+def _(GroupedLeastSquares, __________, np, plt):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_5 = plt.subplot(111)
     ax_5.spines['top'].set_visible(False)
     ax_5.spines['right'].set_visible(False)
-    a_5, b_5 = np.polyfit(__________, __________, 1)
-    # Let's include a line of best fit too
-    plt.plot(__________, a_5 * __________ + b_5, color='steelblue', label='Raw')
-    a_5, b_5 = np.polyfit(__________, __________, 1)
-    plt.plot(__________, a_5 * __________ + b_5, color='firebrick', label='Badly adjusted')
+    fits_5 = GroupedLeastSquares(__________, __________, __________)
+    a_5, b_5 = fits_5.line()
+    # Let's include a line of best fit too, drawn from its two end points
+    ends_5 = np.array([__________.min(), __________.max()])
+    plt.plot(ends_5, a_5 * ends_5 + b_5, color='steelblue', label='Raw')
+    a_5, b_5 = fits_5.line(__________)
+    ends_5 = np.array([__________.min(), __________.max()])
+    plt.plot(ends_5, a_5 * ends_5 + b_5, color='firebrick', label='Badly adjusted')
     plt.legend(loc='upper left')
     plt.ylabel('Number of Rides', fontsize=16)
     plt.xlabel('Number of Advertisements', fontsize=16)
@@ -1,9 +1,10 @@
 # /// script
 # dependencies = [
-#     "causalgraphicalmodels",
+#  "graphviz",
 #  "marimo",
 #  "matplotlib",
 #  "numpy",
+#  "pandas",
 #  "scipy",
 # ]
 # ///
@@ -27,32 +28,17 @@ def _(mo):
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
-    The `causalgraphicalmodels` package is really useful when you're learning causal inference concepts, but unfortunately it's been broken since python 3.10.x. Let's fix it in one line. I really should open a PR with this fix...
+    The `causalgraphicalmodels` package is really useful when you're learning causal inference concepts, but unfortunately it's been broken since python 3.10.x. Instead of monkey-patching it, we'll use `causal_tutorial.scm`, a small copy of the same API (`StructuralCausalModel`, `linear_model`, `logistic_model`, `.cgm` and `.draw()`) that lives in this repo.
     """)
     return
 
 
-@app.cell
-def _():
-    # Fix the Python <= 3.10 compatibility issue by monkey-patching collections
-    # This must happen before importing causalgraphicalmodels
-    import collections
-    import collections.abc
-
-    # Add the moved classes back to collections for backwards compatibility
-    collections.Iterable = collections.abc.Iterable
-    collections.Mapping = collections.abc.Mapping
-    collections.MutableMapping = collections.abc.MutableMapping
-    collections.MutableSet = collections.abc.MutableSet
-    collections.Callable = collections.abc.Callable
-    return
-
-
 @app.cell
 def _():
     # Some important imports
 
-    from causalgraphicalmodels.csm import StructuralCausalModel, linear_model, logistic_model
+    from causal_tutorial.scm import StructuralCausalModel, linear_model, logistic_model
+    from causal_tutorial.plotting import scatter_with_fit
     import matplotlib.pyplot as plt
     import numpy as np
     from scipy.stats import norm, pearsonr
@@ -65,6 +51,7 @@ def _():
         np,
         pearsonr,
         plt,
+        scatter_with_fit,
     )
 
 
@@ -168,18 +155,15 @@ def _(mo):
 
 
 @app.cell
-def _(data, np, plt):
+def _(data, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax = plt.subplot(111)
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
 
-    # Let's include a line of best fit too
-    a, b = np.polyfit(data['price'], data['bookings'], 1)
-    plt.plot(data['price'], a*data['price']+b, color = "dimgray")
-
-    plt.scatter(data['price'], data['bookings'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data['price'], data['bookings'], ax=ax)
     plt.ylabel("Bookings Each Week", fontsize=16)
     plt.xlabel("Price (USD)", fontsize=16)
     plt.title("Raw correlation between price and bookings each week", fontsize = 16)
@@ -219,22 +203,38 @@ def _(data2, pearsonr):
 
 
 @app.cell
-def _(data2, np, plt):
+def _(data2, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_1 = plt.subplot(111)
     ax_1.spines['top'].set_visible(False)
     ax_1.spines['right'].set_visible(False)
-    a_1, b_1 = np.polyfit(data2['price'], data2['bookings'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data2['price'], a_1 * data2['price'] + b_1, color='dimgray')
-    plt.scatter(data2['price'], data2['bookings'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data2['price'], data2['bookings'], ax=ax_1)
     plt.ylabel('Bookings Each Week', fontsize=16)
     plt.xlabel('Price (USD)', fontsize=16)
     plt.title('Adjusted correlation between price and bookings each week', fontsize=16)
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Picking 20 degrees was arbitrary. `stratified_association` repeats the same restriction for every temperature in the data at once, and pools the per-temperature slopes into one estimate:
+    """)
+    return
+
+
+@app.cell
+def _(data):
+    from causal_tutorial.stats import GroupedLeastSquares, stratified_association
+
+    by_temperature = stratified_association(data['price'], data['bookings'], data['temperature'])
+    print(f"Pooled slope = {round(by_temperature.pooled_slope, 3)} (SE {round(by_temperature.pooled_slope_se, 3)})")
+    by_temperature.table.head()
+    return (GroupedLeastSquares,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -301,16 +301,14 @@ def _(data_1, pearsonr):
 
 
 @app.cell
-def _(data_1, np, plt):
+def _(data_1, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_2 = plt.subplot(111)
     ax_2.spines['top'].set_visible(False)
     ax_2.spines['right'].set_visible(False)
-    a_2, b_2 = np.polyfit(data_1['number_rated_items'], data_1['number_purchases'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data_1['number_rated_items'], a_2 * data_1['number_rated_items'] + b_2, color='dimgray')
-    plt.scatter(data_1['number_rated_items'], data_1['number_purchases'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data_1['number_rated_items'], data_1['number_purchases'], ax=ax_2)
     plt.ylabel('Number of Purchases', fontsize=16)
     plt.xlabel('Number of Items Rated', fontsize=16)
     plt.title('Raw correlation between # of ratings and # of purchases', fontsize=16)
@@ -366,17 +364,21 @@ def _(mo):
 
 
 @app.cell
-def _(data2_1, data_1, np, plt):
+def _(GroupedLeastSquares, data2_1, data_1, np, plt):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_3 = plt.subplot(111)
     ax_3.spines['top'].set_visible(False)
     ax_3.spines['right'].set_visible(False)
-    a_3, b_3 = np.polyfit(data_1['number_rated_items'], data_1['number_purchases'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data_1['number_rated_items'], a_3 * data_1['number_rated_items'] + b_3, color='steelblue', label='Raw')
-    a_3, b_3 = np.polyfit(data2_1['number_rated_items'], data2_1['number_purchases'], 1)
-    plt.plot(data2_1['number_rated_items'], a_3 * data2_1['number_rated_items'] + b_3, color='firebrick', label='Badly adjusted')
+    # Sums per number_emails value are computed once, both lines come from them
+    fits_3 = GroupedLeastSquares(data_1['number_rated_items'], data_1['number_purchases'], data_1['number_emails'])
+    a_3, b_3 = fits_3.line()
+    # Let's include a line of best fit too, drawn from its two end points
+    ends_3 = np.array([data_1['number_rated_items'].min(), data_1['number_rated_items'].max()])
+    plt.plot(ends_3, a_3 * ends_3 + b_3, color='steelblue', label='Raw')
+    a_3, b_3 = fits_3.line([1])
+    ends_3 = np.array([data2_1['number_rated_items'].min(), data2_1['number_rated_items'].max()])
+    plt.plot(ends_3, a_3 * ends_3 + b_3, color='firebrick', label='Badly adjusted')
     plt.legend(loc='upper left')
     plt.ylabel('Number of Purchases', fontsize=16)
     plt.xlabel('Number of Items Rated', fontsize=16)
@@ -454,16 +456,14 @@ def _(data_2, pearsonr):
 
 
 @app.cell
-def _(data_2, np, plt):
+def _(data_2, plt, scatter_with_fit):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_4 = plt.subplot(111)
     ax_4.spines['top'].set_visible(False)
     ax_4.spines['right'].set_visible(False)
-    a_4, b_4 = np.polyfit(data_2['advertise'], data_2['rides'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data_2['advertise'], a_4 * data_2['advertise'] + b_4, color='dimgray')
-    plt.scatter(data_2['advertise'], data_2['rides'])
+    # A sample of the points, plus a line of best fit from all of them
+    scatter_with_fit(data_2['advertise'], data_2['rides'], ax=ax_4)
     plt.ylabel('Number of Rides', fontsize=16)
     plt.xlabel('Number of Advertisements', fontsize=16)
     plt.title('Raw correlation between advertisements shown and rides taken', fontsize=16)
@@ -505,17 +505,20 @@ def _(data2_2, pearsonr):
 
 
 @app.cell
-def _(data2_2, data_2, np, plt):
+def _(GroupedLeastSquares, data2_2, data_2, np, plt):
     # Some plot formatting
     plt.rcParams['figure.figsize'] = (15, 10)
     ax_5 = plt.subplot(111)
     ax_5.spines['top'].set_visible(False)
     ax_5.spines['right'].set_visible(False)
-    a_5, b_5 = np.polyfit(data_2['advertise'], data_2['rides'], 1)
-    # Let's include a line of best fit too
-    plt.plot(data_2['advertise'], a_5 * data_2['advertise'] + b_5, color='steelblue', label='Raw')
-    a_5, b_5 = np.polyfit(data2_2['advertise'], data2_2['rides'], 1)
-    plt.plot(data2_2['advertise'], a_5 * data2_2['advertise'] + b_5, color='firebrick', label='Badly adjusted')
+    fits_5 = GroupedLeastSquares(data_2['advertise'], data_2['rides'], data_2['subscribers'])
+    a_5, b_5 = fits_5.line()
+    # Let's include a line of best fit too, drawn from its two end points
+    ends_5 = np.array([data_2['advertise'].min(), data_2['advertise'].max()])
+    plt.plot(ends_5, a_5 * ends_5 + b_5, color='steelblue', label='Raw')
+    a_5, b_5 = fits_5.line([24])
+    ends_5 = np.array([data2_2['advertise'].min(), data2_2['advertise'].max()])
+    plt.plot(ends_5, a_5 * ends_5 + b_5, color='firebrick', label='Badly adjusted')
     plt.legend(loc='upper left')
     plt.ylabel('Number of Rides', fontsize=16)
     plt.xlabel('Number of Advertisements', fontsize=16)
@@ -575,6 +578,16 @@ def _(mo):
     return
 
 
+@app.cell
+def _(complex_example):
+    from causal_tutorial.adjustment import backdoor_sets
+
+    # Every minimal set of covariates that satisfies the backdoor criterion for C -> E.
+    # The only one is the empty set.
+    backdoor_sets(complex_example, 'C', 'E')
+    return
+
+
 @app.cell
 def _(StructuralCausalModel, linear_model, np):
     # Let's set up our variables and causal relationships for this example
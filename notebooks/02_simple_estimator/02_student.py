@@ -8,12 +8,6 @@ __generated_with = "0.18.4"
 app = marimo.App()
 
 
-@app.cell
-def _():
-    import subprocess
-    return (subprocess,)
-
-
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -22,17 +16,9 @@ def _(mo):
     return
 
 
-@app.cell
-def _(subprocess):
-    #! apt-get install graphviz
-    subprocess.call(['apt-get', 'install', 'graphviz'])
-    # packages added via marimo's package management: matplotlib pandas sklearn pydot !pip install matplotlib pandas sklearn pydot
-    return
-
-
 @app.cell
 def _():
-    from graphviz import Digraph
+    from causal_tutorial.rendering import Digraph
     import matplotlib.pyplot as plt
     import pandas as pd
     from sklearn.metrics import classification_report
@@ -42,10 +28,15 @@ def _():
     from sklearn.neighbors import NearestNeighbors
     from sklearn.preprocessing import StandardScaler
 
+    from causal_tutorial.preprocessing import ChurnPreprocessor
+    from causal_tutorial.slearner import SLearner
+
     # '%matplotlib inline' command supported automatically in marimo
     return (
+        ChurnPreprocessor,
         Digraph,
         GradientBoostingClassifier,
+        SLearner,
         StandardScaler,
         classification_report,
         pd,
@@ -95,23 +86,12 @@ def _(mo):
 
 @app.cell
 def _(Digraph):
+    from causal_tutorial.graphs import CHURN_EDGES
+
     g = Digraph('churn_causality')
-    g.edge('internation_plan', 'churn')
-    g.edge('age', 'churn')
-    g.edge('region', 'churn')
-    g.edge('customer_service_calls', 'churn')
-    g.edge('acct_length', 'customer_service_calls')
-    g.edge('daytime_call_mins', 'acct_length')
-    g.edge('evening_call_mins', 'acct_length')
-    g.edge('nighttime_call_mins', 'acct_length')
-    g.edge('voicemail_plan', 'churn')
-    g.edge('age', 'internation_plan')
-    g.edge('age', 'voicemail_plan')
-    g.edge('region', 'internation_plan')
-    g.edge('region', 'voicemail_plan')
-    g.edge('acct_length', 'churn')
+    g.edges(CHURN_EDGES)
     g
-    return
+    return (CHURN_EDGES,)
 
 
 @app.cell(hide_code=True)
@@ -123,10 +103,32 @@ def _(mo):
 
 
 @app.cell
-def _(pd):
-    df = pd.read_csv("https://raw.githubusercontent.com/ronikobrosly/misc_dataset/main/causal_churn.csv")
+def _(CHURN_EDGES):
+    from causal_tutorial.adjustment import minimal_backdoor_set
+
+    # The backdoor criterion, applied to the same edges as the DAG above, agrees
+    minimal_backdoor_set(CHURN_EDGES, 'internation_plan', 'churn')
+    return
+
+
+@app.cell
+def _():
+    from causal_tutorial.datasets import load_churn
+
+    # Reads the copy in `data/` (only downloading it if that's missing) and caches a parsed version for faster reruns
+    df = load_churn()
     df.head()
-    return (df,)
+    return df, load_churn
+
+
+@app.cell
+def _(CHURN_EDGES, df):
+    from causal_tutorial.validation import validate_dag
+
+    # Every independence the DAG implies, tested against the data. Rows flagged as
+    # violated point at edges the whiteboard DAG may be missing.
+    validate_dag(df, CHURN_EDGES).head(10)
+    return
 
 
 @app.cell(hide_code=True)
@@ -322,6 +324,25 @@ def _(mo):
     return
 
 
+@app.cell
+def _(mo):
+    # 200 model refits take a while on a laptop, so they only run on request
+    run_bootstrap = mo.ui.run_button(label='Run 200 bootstrap replicates')
+    run_bootstrap
+    return (run_bootstrap,)
+
+
+@app.cell
+def _(GradientBoostingClassifier, SLearner, df2, features_1, mo, run_bootstrap):
+    mo.stop(not run_bootstrap.value, mo.md('Click the button above to compute the bootstrap confidence interval.'))
+
+    # Each replicate refits the model on a resample of df2. Replicates run in parallel and are seeded, so reruns give the same interval.
+    boot = SLearner(GradientBoostingClassifier(random_state=512), features_1, treatment='int_plan_yes').bootstrap(df2, 'churn', n_replicates=200, seed=512)
+    ate_lower, ate_upper = boot.ci('ate')
+    print(f'ATE = {round(boot.point.ate, 3)} (95% CI {round(ate_lower, 3)} to {round(ate_upper, 3)})')
+    return
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -348,6 +369,78 @@ def _(_________):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    The `causal_tutorial.slearner` module packages up everything we just did by hand. Instead of copying the dataset twice, it stacks the treated and control versions of every row into one array, scores them with a single `predict_proba` call, and gives back the ATE, ATT and ATC together.
+    """)
+    return
+
+
+@app.cell
+def _(SLearner, df2, features_1, model):
+    effects = SLearner(model, features_1, treatment='int_plan_yes').effects(df2)
+    print(f'ATE = {round(effects.ate, 3)}, ATT = {round(effects.att, 3)}, ATC = {round(effects.atc, 3)}')
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    The outcome model is pluggable: pass the name of a learner instead of a model. `hist_gradient_boosting` bins the features into histograms, uses all of your cores, and splits on `region` directly, so it doesn't need the eight region dummies.
+    """)
+    return
+
+
+@app.cell
+def _(ChurnPreprocessor, SLearner, df):
+    df_native = ChurnPreprocessor(native_categorical=['region']).fit(df).transform_frame(df)
+    df_native['churn'] = df['churn'].to_numpy()
+    hgb_effects = SLearner('hist_gradient_boosting', ['age', 'region', 'int_plan_yes'], treatment='int_plan_yes', categorical=['region'], random_state=512).fit(df_native, 'churn').effects(df_native)
+    print(f'ATE = {round(hgb_effects.ate, 3)}, ATT = {round(hgb_effects.att, 3)}, ATC = {round(hgb_effects.atc, 3)}')
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    The S-learner treats `int_plan_yes` as just another feature, and a tree model can almost ignore it. The T-learner fits one model per treatment arm instead, and the X-learner goes one step further by regressing each customer's imputed effect on their covariates. Both are cross-fitted (every customer's effect comes from models that never saw them) and return one conditional average treatment effect (CATE) per customer, so we can look at how the effect varies instead of only its average.
+    """)
+    return
+
+
+@app.cell
+def _(df2, features_1, pd):
+    from causal_tutorial.metalearners import TLearner, XLearner
+
+    covariates = [f for f in features_1 if f != 'int_plan_yes']
+    t_learner = TLearner('gradient_boosting', covariates, treatment='int_plan_yes', random_state=512).fit(df2, 'churn')
+    x_learner = XLearner('gradient_boosting', covariates, treatment='int_plan_yes', random_state=512).fit(df2, 'churn')
+    pd.DataFrame({'T-learner': t_learner.cate_, 'X-learner': x_learner.cate_}).describe()
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    To score new customers in production, bundle the fitted `model` with its preprocessing once (`CATEScorer.save` / `CATEScorer.load`) and stream batches through it. Each batch scores both arms in one `predict_proba` call, and the scorer keeps track of its p50/p99 latency.
+    """)
+    return
+
+
+@app.cell
+def _(ChurnPreprocessor, features_1, load_churn, model, pd):
+    from causal_tutorial.scoring import CATEScorer
+
+    # The scorer standardizes raw rows itself, so it gets a fresh, unscaled copy of the data
+    raw_df = load_churn()
+    scorer = CATEScorer(model, ChurnPreprocessor().fit(raw_df), features_1, treatment='int_plan_yes')
+    scored = pd.concat(scorer.score_stream(raw_df.iloc[i:i + 500] for i in range(0, len(raw_df), 500)))
+    print(scorer.latency.summary())
+    scored['cate'].describe()
+    return
+
+
 @app.cell
 def _():
     import marimo as mo
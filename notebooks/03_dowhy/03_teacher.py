@@ -300,6 +300,26 @@ def _(mo):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Matching on a one-dimensional score doesn't need a neighbor search: `propensity_matching` sorts the control scores once and finds every treated unit's nearest control with a binary search, so it scales to millions of employees. It also supports a caliper and matching without replacement, and `match_mahalanobis` matches directly on the confounders with a KD-tree.
+    """)
+    return
+
+
+@app.cell
+def _(data, estimate_psm):
+    from causal_tutorial.matching import propensity_matching
+
+    confounders = ['age', 'initial_health', 'job_stress']
+
+    print(f"DoWhy matching:  {estimate_psm.value:.3f}")
+    print(f"Sorted matching: {propensity_matching(data, 'wellness_program', 'health_score_change', confounders):.3f}")
+    print(f"With a 0.2 SD caliper, without replacement: {propensity_matching(data, 'wellness_program', 'health_score_change', confounders, caliper=0.2, caliper_scale='logit_sd', replace=False):.3f}")
+    return (confounders,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -322,6 +342,27 @@ def _(identified_estimand, model):
     return (estimate_pss,)
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Matching and stratification each fitted their own logistic regression of `wellness_program` on the same three confounders. `causal_tutorial.propensity` fits that model once per data, confounder set and learner, and keeps it in a small cache: every propensity estimator below, and the matching cell above, reuse the same fit. Only the first request is a cache miss.
+    """)
+    return
+
+
+@app.cell
+def _(confounders, data, identified_estimand):
+    from causal_tutorial.estimands import estimate_effect
+    from causal_tutorial.propensity import propensity_cache_info
+
+    for _method in ['matching', 'stratification', 'weighting']:
+        _estimate = estimate_effect(data, identified_estimand, f"backdoor.propensity_score_{_method}")
+        print(f"{_method:>14}: {_estimate.value:.3f}")
+
+    print(propensity_cache_info())
+    return
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -424,6 +465,22 @@ def _(mo):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Each refuter above re-estimates the effect 100 times, one simulation after another. `refutation_suite` runs the simulations of all three refuters together on a process pool, each with its own seed, and collects the results in one table. For a linear regression estimate, the placebo and random common cause simulations don't even refit the model: they are solved in closed form from a single factorization of the confounders.
+    """)
+    return
+
+
+@app.cell
+def _(data, estimate_lr, identified_estimand):
+    from causal_tutorial.refutation import refutation_suite
+
+    refutation_suite(data, identified_estimand, estimate_lr, seed=42)
+    return
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -460,6 +517,22 @@ def _(CausalModel, causal_graph, data):
     return data_eng, estimate_eng, identified_estimand_eng, model_eng
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    Building a new `CausalModel` per department re-parses the graph and re-runs identification every time, even though the estimand only depends on the graph. `subgroup_effects` identifies once (cached by a hash of the graph) and estimates every department in parallel:
+    """)
+    return
+
+
+@app.cell
+def _(causal_graph, data):
+    from causal_tutorial.estimands import subgroup_effects
+
+    subgroup_effects(data, causal_graph, 'wellness_program', 'health_score_change', by='department', confidence_intervals=True)
+    return
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""